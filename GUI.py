@@ -1,13 +1,12 @@
 from pygame import Rect
 from pygame import transform
 from pygame import draw
-from pygame import image
 from pygame import Surface
 
-from pygame.font import Font
-
 from typing import Callable
 
+import resources
+
 
 class VisualElement:
     """
@@ -62,14 +61,33 @@ class VisualElement:
 class ImageButton(VisualElement):
     """
     A button that displays an image. Performs an action when clicked.
-    The image is resized to fit the button's size.
+    The image is resized to fit the button's size. It can be given as the path
+    of an asset, which is only loaded when the button is first drawn on the screen.
     """
 
-    def __init__(self, x: int, y: int, width: int, height: int, image: Surface):
+    def __init__(self, x: int, y: int, width: int, height: int, image: Surface | str):
         super().__init__(x, y, width, height)
-        super().set_surface(image)
+        self.image: str = None
+        self.set_image(image)
         self.on_click: Callable = None
 
+    def set_image(self, image: Surface | str):
+        if isinstance(image, str):
+            self.image = image
+        else:
+            self.image = None
+            self.set_surface(image)
+
+    def draw(self, screen: Surface):
+        # Buttons off the screen (e.g. in a hidden panel) don't need their image yet
+        if not screen.get_rect().colliderect(self.rect):
+            return
+
+        if self.image is not None:
+            self.set_surface(resources.image(self.image))
+            self.image = None
+        super().draw(screen)
+
 
 class PatternSlider(VisualElement):
     """
@@ -87,13 +105,16 @@ class PatternSlider(VisualElement):
 
         self.index = 0
 
+        # Shown instead of a pattern while there are none
+        self.empty_text = "Loading..."
+
         buttons_size = self.size // 2
         self.prev_button = ImageButton(
             self.x - buttons_size,
             self.y + buttons_size,
             buttons_size,
             buttons_size,
-            image.load("assets/img/back-bttn.png"),
+            "assets/img/back-bttn.png",
         )
         self.prev_button.on_click = self.previous
 
@@ -102,37 +123,37 @@ class PatternSlider(VisualElement):
             self.y + buttons_size,
             buttons_size,
             buttons_size,
-            image.load("assets/img/next-bttn.png"),
+            "assets/img/next-bttn.png",
         )
         self.next_button.on_click = self.next
 
-        self.font = Font("assets/font/Pixellari.ttf", 16)
-
     def add_pattern(self, pattern):
         """
         Add a pattern to the slider.
         """
         self.patterns.append(pattern)
 
-        self.names.append(self.font.render(pattern.name, True, (255, 255, 255)))
+        self.names.append(resources.text(pattern.name, 16))
 
     def selected(self):
         """
-        Get the selected item.
+        Get the selected item, None while there are no patterns (e.g. still loading).
         """
-        return self.patterns[self.index]
+        return self.patterns[self.index] if self.patterns else None
 
     def next(self):
         """
         Select the next item.
         """
-        self.index = (self.index + 1) % len(self.patterns)
+        if self.patterns:
+            self.index = (self.index + 1) % len(self.patterns)
 
     def previous(self):
         """
         Select the previous item.
         """
-        self.index = (self.index - 1) % len(self.patterns)
+        if self.patterns:
+            self.index = (self.index - 1) % len(self.patterns)
 
     def draw_layout(self, screen):
         """
@@ -164,21 +185,132 @@ class PatternSlider(VisualElement):
         """
         Draw the slider on the screen.
         """
-
-        self.draw_layout(screen)
+        if not screen.get_rect().colliderect(self.rect):
+            return
 
         self.prev_button.draw(screen)
         self.next_button.draw(screen)
 
+        # The patterns are loaded in the background
+        if self.patterns:
+            self.draw_layout(screen)
+            name = self.names[self.index]
+        else:
+            name = resources.text(self.empty_text, 16)
+
+        screen.blit(
+            name,
+            (self.rect.x + (self.size // 2) - (name.get_width() // 2), self.rect.y + self.size + 10),
+        )
+
+
+class ProgressBar(VisualElement):
+    """
+    A bar that fills up with the progress of a long task, with a line of text under it.
+    """
+
+    def __init__(self, x: int, y: int, width: int, bar_height: int, color=(100, 120, 175)):
+        self.font = resources.font(16)
+        super().__init__(x, y, width, bar_height + self.font.get_height() + 24, (11, 20, 26))
+
+        self.bar = Rect(x + 8, y + 8, width - 16, bar_height)
+        self.color = color
+
+        self.text = self.font.render("", True, (255, 255, 255))
+        self.progress = 0
+
+    def update(self, progress: float, text: str):
+        """
+        Set the progress (between 0 and 1) and the text under the bar.
+        """
+        self.progress = min(max(progress, 0), 1)
+        self.text = self.font.render(text, True, (255, 255, 255))
+
+    def draw(self, screen: Surface):
+        super().draw(screen)
+
+        filled = self.bar.copy()
+        filled.width = int(self.bar.width * self.progress)
+        draw.rect(screen, self.color, filled)
+        draw.rect(screen, (255, 255, 255), self.bar, 1)
+
         screen.blit(
-            self.names[self.index],
-            (
-                self.rect.x + (self.size // 2) - (self.names[self.index].get_width() // 2),
-                self.rect.y + self.size + 10,
-            ),
+            self.text,
+            (self.rect.centerx - self.text.get_width() // 2, self.bar.bottom + 8),
         )
 
 
+class Sparkline(VisualElement):
+    """
+    A small line chart of the latest values of a series, with the last value as text.
+    """
+
+    def __init__(self, x: int, y: int, width: int, height: int, label: str, color=(100, 120, 175)):
+        self.font = resources.font(14)
+        super().__init__(x, y, width, height, (11, 20, 26))
+
+        self.label = label
+        self.color = color
+        self.values = []
+        self.text = resources.text(label, 14)
+
+    def update(self, values: list):
+        """
+        Set the values shown, oldest first. Only the last ones that fit are drawn.
+        """
+        self.values = values[-self.rect.width :]
+        if self.values:
+            self.text = resources.text(f"{self.label} {self.values[-1]}", 14)
+
+    def draw(self, screen: Surface):
+        super().draw(screen)
+
+        chart = self.rect.inflate(-4, -(self.font.get_height() + 6))
+        chart.bottom = self.rect.bottom - 2
+
+        values = self.values[-chart.width :]
+        if len(values) > 1:
+            low, high = min(values), max(values)
+            scale = (chart.height - 1) / ((high - low) or 1)
+            points = [
+                (chart.x + i, chart.bottom - 1 - int((value - low) * scale))
+                for i, value in enumerate(values)
+            ]
+            draw.lines(screen, self.color, False, points)
+
+        screen.blit(self.text, (self.rect.x + 2, self.rect.y + 2))
+
+
+class TextInput(VisualElement):
+    """
+    A single line text box with a label, filled with key presses.
+    Only the characters in allowed are accepted.
+    """
+
+    def __init__(self, x: int, y: int, width: int, label: str, allowed: str = None):
+        self.font = resources.font(18)
+        super().__init__(x, y, width, self.font.get_height() + 16, (11, 20, 26))
+
+        self.label = label
+        self.allowed = allowed
+        self.text = ""
+
+    def type(self, character: str):
+        """
+        Add a character, or remove the last one with a backspace.
+        """
+        if character == "\b":
+            self.text = self.text[:-1]
+        elif character and (self.allowed is None or character in self.allowed):
+            self.text += character
+
+    def draw(self, screen: Surface):
+        super().draw(screen)
+
+        rendered = resources.text(f"{self.label} {self.text}_", 18)
+        screen.blit(rendered, (self.rect.x + 8, self.rect.y + 8))
+
+
 class Panel(VisualElement):
     """
     A background panel that contains other elements inside of it and can slide up.
@@ -298,9 +430,9 @@ class Menu:
         self.x = None
         self.y = None
 
-        self.font = Font("assets/font/Pixellari.ttf", 18)
+        self.font = resources.font(18)
 
-        self.text = self.font.render(text, True, (255, 255, 255))
+        self.text = resources.text(text, 18)
         self.items = []
 
         self.background = None
@@ -314,8 +446,8 @@ class Menu:
         button.
         """
         # TODO: check if item is Menu or MenuItem
-        item.default_text = self.font.render(item.text, True, (255, 255, 255))
-        item.hover_text = self.font.render(item.text, True, (100, 120, 175))
+        item.default_text = resources.text(item.text, 18)
+        item.hover_text = resources.text(item.text, 18, (100, 120, 175))
 
         item.text = item.default_text
 
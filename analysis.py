@@ -0,0 +1,215 @@
+# This module analyses the patterns of the library once and caches the results.
+#
+# For every pattern it finds the period, the displacement and speed (for spaceships),
+# the bounding box over a full period, the population range and a canonical name
+# (the apgcode, see census.py) with its hash, so duplicates can be spotted. Patterns
+# that aren't periodic have no apgcode, their hash is the one of their starting cells.
+#
+# The results are kept in a cache file next to the patterns, keyed by the hash of each
+# file's content. A pattern is only simulated again when its file changes, and it's
+# only decoded when its cells are used, so browsing, filtering and sorting thousands
+# of patterns doesn't run any simulation or decode any file.
+#
+# Usage:
+#   python analysis.py --kind spaceship --speed c/4 --sort population
+
+import argparse
+import hashlib
+import json
+import os
+
+import census
+import engine
+import formats
+
+from life import Pattern
+from typing import Callable, Dict, List
+
+CACHE_FILE = ".analysis.json"
+
+# Patterns whose bounding box has more cells are left out of the library
+MAX_CELLS = 1 << 20
+EXTENSIONS = tuple(formats.EXTENSIONS)
+
+
+def content_hash(file_path: str) -> str:
+    with open(file_path, "rb") as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+def _hash(code: str) -> str:
+    return hashlib.sha256(code.encode()).hexdigest()[:16]
+
+
+def analyze(pattern: Pattern, max_period: int = 256) -> dict:
+    """
+    Run a pattern for up to max_period generations and describe it.
+    """
+    cells = set(engine.cells(pattern.rows))
+    if not cells:
+        return {
+            "kind": "empty",
+            "period": None,
+            "population": [0, 0],
+            "bounding_box": None,
+            "canonical_hash": _hash("empty"),
+        }
+
+    start, (start_x, start_y) = census.normalize(cells)
+    plane = census.Plane.from_cells(cells)
+
+    phases = [start]
+    populations = [len(cells)]
+    box = [min(x for x, _ in cells), min(y for _, y in cells)]
+    box += [max(x for x, _ in cells), max(y for _, y in cells)]
+
+    # The same cells in any position, rotation or reflection get the same hash
+    info = {"kind": "aperiodic", "period": None, "canonical_hash": _hash(census.canonical([start]))}
+    for period in range(1, max_period + 1):
+        plane.step()
+        current = plane.cells()
+        if not current:
+            info["kind"] = "dies"
+            break
+
+        shape, (x, y) = census.normalize(current)
+        if shape == start:
+            dx, dy = x - start_x, y - start_y
+            info["period"] = period
+            info["displacement"] = [dx, dy]
+
+            if dx or dy:
+                info["kind"] = "spaceship"
+                info["speed"], info["direction"] = census.speed(dx, dy, period)
+                info["apgcode"] = f"xq{period}_{census.canonical(phases)}"
+            elif period == 1:
+                info["kind"] = "still life"
+                info["apgcode"] = f"xs{len(start)}_{census.canonical(phases)}"
+            else:
+                info["kind"] = "oscillator"
+                info["apgcode"] = f"xp{period}_{census.canonical(phases)}"
+
+            # Every phase of a periodic object gets the same hash
+            info["canonical_hash"] = _hash(info["apgcode"])
+            break
+
+        phases.append(shape)
+        populations.append(len(current))
+        box = [
+            min(box[0], min(x for x, _ in current)),
+            min(box[1], min(y for _, y in current)),
+            max(box[2], max(x for x, _ in current)),
+            max(box[3], max(y for _, y in current)),
+        ]
+
+    info["population"] = [min(populations), max(populations)]
+    info["bounding_box"] = box
+    return info
+
+
+def _reader(path: str) -> Callable[[], List[int]]:
+    return lambda: formats.read(path).rows
+
+
+class PatternLibrary:
+    """
+    The patterns of a folder, with their analysis attached as Pattern.metadata.
+    The patterns are lazy (see Pattern.lazy), a file is decoded when its cells are used.
+    Patterns larger than MAX_CELLS are left out, they would take too long to analyse.
+
+    Attributes:
+        directory (str): The folder containing the pattern files.
+        patterns (list): The patterns.
+    """
+
+    def __init__(self, directory: str = "patterns"):
+        self.directory = directory
+        self.cache_path = os.path.join(directory, CACHE_FILE)
+        self.patterns: List[Pattern] = []
+
+        cache: Dict[str, dict] = {}
+        if os.path.exists(self.cache_path):
+            with open(self.cache_path, "r") as file:
+                cache = json.load(file)
+
+        fresh = {}
+        for file_name in sorted(os.listdir(directory)):
+            if not file_name.lower().endswith(EXTENSIONS):
+                continue
+
+            path = os.path.join(directory, file_name)
+            key = content_hash(path)
+
+            # Only patterns that are new or have changed are decoded and analysed
+            if key not in cache or "size" not in cache[key]:
+                pattern = formats.read(path)
+                size = [pattern.width, pattern.size]
+                if pattern.width * pattern.size > MAX_CELLS:
+                    cache[key] = {"kind": "too large", "name": pattern.name, "size": size}
+                else:
+                    cache[key] = dict(analyze(pattern), name=pattern.name, size=size)
+
+            entry = cache[key]
+            fresh[key] = entry
+            if entry["kind"] == "too large":
+                continue
+
+            pattern = Pattern.lazy(entry["name"], *entry["size"], _reader(path))
+            pattern.metadata = dict(entry, file=file_name)
+            self.patterns.append(pattern)
+
+        # Entries of deleted or changed files are dropped
+        if fresh != cache or not os.path.exists(self.cache_path):
+            with open(self.cache_path, "w") as file:
+                json.dump(fresh, file, indent=1)
+
+    def filter(self, **conditions) -> List[Pattern]:
+        """
+        The patterns whose metadata matches every condition, e.g. filter(kind="spaceship").
+        """
+        return [
+            pattern
+            for pattern in self.patterns
+            if all(pattern.metadata.get(key) == value for key, value in conditions.items())
+        ]
+
+    def sorted(self, key: Callable = None, patterns: List[Pattern] = None) -> List[Pattern]:
+        """
+        Sort patterns by a metadata field name or a function of the metadata.
+        """
+        patterns = self.patterns if patterns is None else patterns
+        field = key if isinstance(key, str) else "name"
+
+        def by_field(metadata):
+            # Patterns without the field (e.g. no period) go last
+            return metadata.get(field) is None, metadata.get(field)
+
+        key = by_field if key is None or isinstance(key, str) else key
+        return sorted(patterns, key=lambda pattern: key(pattern.metadata))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Browse the analysed pattern library")
+    parser.add_argument("--directory", default="patterns")
+    parser.add_argument("--kind", help="still life, oscillator, spaceship, aperiodic or dies")
+    parser.add_argument("--speed", help="e.g. c/4")
+    parser.add_argument("--period", type=int)
+    parser.add_argument("--sort", default="name", help="a metadata field, e.g. period")
+    args = parser.parse_args()
+
+    library = PatternLibrary(args.directory)
+
+    conditions = {"kind": args.kind, "speed": args.speed, "period": args.period}
+    patterns = library.filter(**{key: value for key, value in conditions.items() if value})
+
+    for pattern in library.sorted(args.sort, patterns):
+        info = pattern.metadata
+        movement = f"{info['speed']} {info['direction']}" if info.get("speed") else ""
+        print(
+            f"{info['name']:<24} {info['kind']:<11} p{info['period'] or '?':<5} {movement:<18}"
+            f" pop {info['population'][0]}-{info['population'][1]:<6} {info.get('apgcode', '')}"
+        )
+
+
+if __name__ == "__main__":
+    main()
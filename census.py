@@ -0,0 +1,439 @@
+# This module runs a census of the objects left behind by random soups.
+#
+# Each soup is a small random square (like the ones created by the reload button)
+# placed on an unbounded plane and run until its population becomes periodic.
+# The remains are then separated into objects (nearby objects that don't interact, like
+# the four blinkers of a traffic light, are counted separately), and each object is run
+# on its own to find its period and displacement, and named with its apgcode, the
+# canonical name used by Catagolue:
+#   xs<population>_<cells>: still lifes, e.g. xs4_33 is the block
+#   xp<period>_<cells>: oscillators, e.g. xp2_7 is the blinker
+#   xq<period>_<cells>: spaceships, e.g. xq4_153 is the glider
+# The cells are written in the extended Wechsler format, taking the smallest code
+# over every rotation, reflection and phase of the object.
+#
+# Seeds are searched in chunks by a pool of processes. The census file is updated
+# after every chunk, and a search that was interrupted resumes where it stopped.
+#
+# Usage:
+#   python census.py --soups 10000 --output census.json
+
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import re
+
+import engine
+
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+_WECHSLER = "0123456789abcdefghijklmnopqrstuv"
+_RUNS = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+_SYMMETRIES = [
+    lambda x, y: (x, y),
+    lambda x, y: (-x, y),
+    lambda x, y: (x, -y),
+    lambda x, y: (-x, -y),
+    lambda x, y: (y, x),
+    lambda x, y: (-y, x),
+    lambda x, y: (y, -x),
+    lambda x, y: (-y, -x),
+]
+
+Cells = Set[Tuple[int, int]]
+
+
+class Plane:
+    """
+    An unbounded universe. The rows grow whenever a live cell gets close to an edge.
+
+    Attributes:
+        rows (list): The rows of the universe, as bit sets.
+        width (int): The current width of the rows.
+        x (int): The plane coordinate of the first column.
+        y (int): The plane coordinate of the first row.
+    """
+
+    GROWTH = 16
+
+    def __init__(self, rows: List[int], width: int, x: int = 0, y: int = 0):
+        self.rows = list(rows)
+        self.width = width
+        self.x = x
+        self.y = y
+
+    @classmethod
+    def from_cells(cls, cells: Iterable[Tuple[int, int]]):
+        cells = list(cells)
+        min_x = min(x for x, _ in cells)
+        min_y = min(y for _, y in cells)
+        height = max(y for _, y in cells) - min_y + 1
+
+        rows = [0] * height
+        for x, y in cells:
+            rows[y - min_y] |= 1 << (x - min_x)
+
+        width = max(row.bit_length() for row in rows)
+        return cls(rows, width, min_x, min_y)
+
+    def _grow(self):
+        """
+        Make sure there is an empty border around the live cells, so no births are lost.
+        """
+        if self.rows[0] or self.rows[-1]:
+            self.rows = [0] * self.GROWTH + self.rows + [0] * self.GROWTH
+            self.y -= self.GROWTH
+
+        merged = 0
+        for row in self.rows:
+            merged |= row
+
+        if merged >> (self.width - 1):
+            self.width += self.GROWTH
+        if merged & 1:
+            self.rows = [row << self.GROWTH for row in self.rows]
+            self.width += self.GROWTH
+            self.x -= self.GROWTH
+
+    def step(self):
+        self._grow()
+        self.rows = engine.step_rows(self.rows, self.width)
+
+    def population(self) -> int:
+        return engine.population(self.rows)
+
+    def cells(self) -> Cells:
+        """
+        The live cells, in plane coordinates.
+        """
+        return {(x + self.x, y + self.y) for x, y in engine.cells(self.rows)}
+
+
+def normalize(cells: Cells) -> Tuple[frozenset, Tuple[int, int]]:
+    """
+    Move the cells so that the top-left corner of their bounding box is (0, 0).
+
+    Returns:
+        tuple: The moved cells and the original corner.
+    """
+    min_x = min(x for x, _ in cells)
+    min_y = min(y for _, y in cells)
+    return frozenset((x - min_x, y - min_y) for x, y in cells), (min_x, min_y)
+
+
+def _zeros(count: int) -> str:
+    code = ""
+    while count >= 4:
+        run = min(count, 39)
+        code += "y" + _RUNS[run - 4]
+        count -= run
+    return code + ["", "0", "w", "x"][count]
+
+
+def wechsler(cells: Cells) -> str:
+    """
+    Encode normalized cells in the extended Wechsler format: the pattern is cut in
+    strips of 5 rows, each column of a strip is a character (top row is the lowest bit),
+    strips are separated by 'z' and runs of empty columns are shortened.
+    """
+    if not cells:
+        return "0"
+
+    width = max(x for x, _ in cells) + 1
+    height = max(y for _, y in cells) + 1
+
+    strips = []
+    for top in range(0, height, 5):
+        columns = []
+        for x in range(width):
+            value = sum(1 << (y - top) for y in range(top, top + 5) if (x, y) in cells)
+            columns.append(_WECHSLER[value])
+
+        strip = "".join(columns).rstrip("0")
+        strips.append(re.sub("0{2,}", lambda match: _zeros(len(match.group())), strip))
+
+    return "z".join(strips)
+
+
+def canonical(phases: Iterable[frozenset]) -> str:
+    """
+    The smallest Wechsler code over every phase, rotation and reflection.
+    """
+    codes = []
+    for phase in phases:
+        for symmetry in _SYMMETRIES:
+            cells, _ = normalize({symmetry(x, y) for x, y in phase})
+            codes.append(wechsler(cells))
+    return min(codes, key=lambda code: (len(code), code))
+
+
+def speed(dx: int, dy: int, period: int) -> Tuple[str, str]:
+    """
+    The speed of a spaceship (e.g. "c/4") and its direction (e.g. "diagonal").
+    """
+    dx, dy = abs(dx), abs(dy)
+    if dx and dy and dx != dy:
+        return f"({dx},{dy})c/{period}", "oblique"
+
+    distance = max(dx, dy)
+    divisor = math.gcd(distance, period)
+    distance, period = distance // divisor, period // divisor
+
+    direction = "diagonal" if dx and dy else "orthogonal"
+    return f"{distance if distance > 1 else ''}c/{period}", direction
+
+
+def classify(cells: Cells, max_period: int = 60) -> Tuple[str, str]:
+    """
+    Run an object on its own to find its period and displacement.
+
+    Returns:
+        tuple: The apgcode of the object and a short description of it.
+    """
+    start, (start_x, start_y) = normalize(cells)
+    plane = Plane.from_cells(cells)
+    phases = [start]
+
+    for period in range(1, max_period + 1):
+        plane.step()
+        current = plane.cells()
+        if not current:
+            break
+
+        shape, (x, y) = normalize(current)
+        if shape != start:
+            phases.append(shape)
+            continue
+
+        dx, dy = x - start_x, y - start_y
+        code = canonical(phases)
+        if dx or dy:
+            return f"xq{period}_{code}", "spaceship, {} {}".format(*speed(dx, dy, period))
+        if period == 1:
+            return f"xs{len(start)}_{code}", "still life"
+        return f"xp{period}_{code}", f"oscillator, period {period}"
+
+    return "UNKNOWN", "not periodic on its own"
+
+
+def components(cells: Cells, distance: int = 2) -> List[Cells]:
+    """
+    Separate cells into groups, where cells closer than a distance belong together.
+    """
+    remaining = set(cells)
+    groups = []
+    while remaining:
+        stack = [remaining.pop()]
+        group = set(stack)
+        while stack:
+            x, y = stack.pop()
+            for i in range(-distance, distance + 1):
+                for j in range(-distance, distance + 1):
+                    neighbor = (x + i, y + j)
+                    if neighbor in remaining:
+                        remaining.remove(neighbor)
+                        group.add(neighbor)
+                        stack.append(neighbor)
+        groups.append(group)
+    return groups
+
+
+def _split(cells: Cells, generations: int) -> List[Cells]:
+    """
+    Split a group of cells into pseudo-objects: the 8-connected parts that evolve on their
+    own exactly like they do together (two blinkers next to each other are two blinkers).
+    The group is kept whole if the parts interact within the generations.
+    """
+    parts = components(cells, 1)
+    if len(parts) == 1:
+        return parts
+
+    whole = Plane.from_cells(cells)
+    planes = [Plane.from_cells(part) for part in parts]
+    for _ in range(generations):
+        whole.step()
+        evolved = set()
+        for plane in planes:
+            plane.step()
+            evolved |= plane.cells()
+        if evolved != whole.cells():
+            return [cells]
+
+    return parts
+
+
+def _population_period(populations: List[int], max_period: int) -> Optional[int]:
+    for period in range(1, max_period + 1):
+        window = max(4 * period, 60)
+        if len(populations) < window + period:
+            break
+        if populations[-window:] == populations[-window - period : -period]:
+            return period
+    return None
+
+
+def _separate(plane: Plane, max_period: int) -> Tuple[Counter, Dict[str, str]]:
+    """
+    Split the current state of a plane into objects and classify them.
+    """
+    # The population can repeat sooner than the objects do (two blinkers out of phase),
+    # the cells visited over the longest period keep every phase of an object together.
+    # Groups of nearby objects that don't interact are then split again.
+    current = plane.cells()
+    visited = set(current)
+    probe = Plane(plane.rows, plane.width, plane.x, plane.y)
+    for _ in range(max_period - 1):
+        probe.step()
+        visited |= probe.cells()
+
+    counts = Counter()
+    descriptions = {}
+    for group in components(visited):
+        for part in _split(group & current, max_period):
+            code, description = classify(part, max_period)
+            counts[code] += 1
+            descriptions[code] = description
+
+    return counts, descriptions
+
+
+def search_soup(
+    seed: int, soup_size: int = 16, max_generations: int = 20000, max_period: int = 60
+) -> Tuple[Counter, Dict[str, str]]:
+    """
+    Run a soup until it stabilizes and count the objects it leaves.
+
+    Returns:
+        tuple: The number of each object (by apgcode) and the description of each object.
+    """
+    plane = Plane(engine.random_rows(soup_size, soup_size, seed), soup_size)
+
+    populations = []
+    result = None
+    for generation in range(max_generations):
+        plane.step()
+        populations.append(plane.population())
+
+        if generation % 30 or not _population_period(populations, max_period):
+            continue
+
+        # Objects that don't repeat on their own mean the soup is still active
+        result = _separate(plane, max_period)
+        if "UNKNOWN" not in result[0]:
+            return result
+
+    return result or (Counter({"PATHOLOGICAL": 1}), {"PATHOLOGICAL": "didn't stabilize"})
+
+
+def _search_chunk(arguments):
+    index, seeds, soup_size, max_generations = arguments
+
+    counts = Counter()
+    descriptions = {}
+    for seed in seeds:
+        soup_counts, soup_descriptions = search_soup(seed, soup_size, max_generations)
+        counts.update(soup_counts)
+        descriptions.update(soup_descriptions)
+
+    return index, len(seeds), counts, descriptions
+
+
+class Census:
+    """
+    The results of a search, saved to a JSON file after every chunk of soups.
+    """
+
+    def __init__(self, path: str, first_seed: int, soup_size: int, chunk_size: int):
+        self.path = path
+        self.settings = {"first_seed": first_seed, "soup_size": soup_size, "chunk_size": chunk_size}
+
+        self.completed: Set[int] = set()
+        self.soups = 0
+        self.objects = Counter()
+        self.descriptions: Dict[str, str] = {}
+
+        if os.path.exists(path):
+            with open(path, "r") as file:
+                data = json.load(file)
+
+            if data["settings"] != self.settings:
+                raise ValueError(f"'{path}' was created with different settings: {data['settings']}")
+
+            self.completed = set(data["completed_chunks"])
+            self.soups = data["soups"]
+            self.objects = Counter(data["objects"])
+            self.descriptions = data["descriptions"]
+
+    def add(self, index: int, soups: int, counts: Counter, descriptions: Dict[str, str]):
+        self.completed.add(index)
+        self.soups += soups
+        self.objects.update(counts)
+        self.descriptions.update(descriptions)
+        self.save()
+
+    def save(self):
+        data = {
+            "settings": self.settings,
+            "soups": self.soups,
+            "completed_chunks": sorted(self.completed),
+            "objects": dict(self.objects.most_common()),
+            "descriptions": self.descriptions,
+        }
+
+        # Write to a temporary file first, an interruption never leaves a broken census
+        temporary = self.path + ".tmp"
+        with open(temporary, "w") as file:
+            json.dump(data, file, indent=1)
+        os.replace(temporary, self.path)
+
+
+def search(
+    census: Census, soups: int, workers: int = None, max_generations: int = 20000, verbose=True
+):
+    """
+    Search soups in a pool of processes, skipping the chunks already in the census.
+    """
+    first_seed = census.settings["first_seed"]
+    chunk_size = census.settings["chunk_size"]
+
+    pending = []
+    for index, start in enumerate(range(first_seed, first_seed + soups, chunk_size)):
+        if index not in census.completed:
+            seeds = range(start, min(start + chunk_size, first_seed + soups))
+            pending.append((index, seeds, census.settings["soup_size"], max_generations))
+
+    with multiprocessing.Pool(workers) as pool:
+        for index, searched, counts, descriptions in pool.imap_unordered(_search_chunk, pending):
+            census.add(index, searched, counts, descriptions)
+            if verbose:
+                print(f"{census.soups} soups searched, {sum(census.objects.values())} objects")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Census of the objects left by random soups")
+    parser.add_argument("--soups", type=int, default=1000, help="total number of soups")
+    parser.add_argument("--output", default="census.json")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first soup")
+    parser.add_argument("--soup-size", type=int, default=16)
+    parser.add_argument("--chunk", type=int, default=50, help="soups per chunk")
+    parser.add_argument("--workers", type=int, default=None, help="processes, all CPUs by default")
+    parser.add_argument("--max-generations", type=int, default=20000)
+    args = parser.parse_args()
+
+    census = Census(args.output, args.seed, args.soup_size, args.chunk)
+    try:
+        search(census, args.soups, args.workers, args.max_generations)
+    except KeyboardInterrupt:
+        print(f"Interrupted, run again to resume ({census.soups} soups saved)")
+        return
+
+    for code, count in census.objects.most_common(20):
+        print(f"{count:>8}  {code}  ({census.descriptions[code]})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,490 @@
+# This module runs a universe split into rectangular blocks across worker processes.
+#
+# Every worker owns one block and only talks to the four workers next to it.
+# Each generation is computed in two halo exchanges:
+#   1. The west and east columns of the block are swapped with the west and east neighbors.
+#   2. The top and bottom rows, extended with the columns received in step 1, are swapped
+#      with the north and south neighbors. This way the diagonal (corner) cells arrive
+#      without having to talk to the diagonal neighbors.
+#
+# The coordinator places the blocks on the workers, drives the generations and
+# collects the global population and the checkpoints. The result is exactly the same
+# as running engine.run on the whole universe.
+#
+# Addresses are either "host:port" (TCP) or "unix:/path/to/socket" (Unix sockets).
+#
+# Usage:
+#   python distributed.py worker ADDRESS
+#   python distributed.py run [PATTERN] --size 600x600 --generations 1000 --local 4
+
+import argparse
+import multiprocessing
+import os
+import socket
+import struct
+import tempfile
+import time
+
+import engine
+
+from threading import Thread
+from typing import Dict, List, Optional, Tuple
+
+# Message types
+HELLO = 1
+ASSIGN = 2
+READY = 3
+STEP = 4
+POPULATION = 5
+GATHER = 6
+BLOCK = 7
+HALO = 8
+SHUTDOWN = 9
+
+# Neighbor directions, in the order they are sent in an ASSIGN message
+WEST, EAST, NORTH, SOUTH = range(4)
+_DIRECTIONS = {WEST: (-1, 0), EAST: (1, 0), NORTH: (0, -1), SOUTH: (0, 1)}
+
+_HEADER = struct.Struct("!BI")
+_GEOMETRY = struct.Struct("!IIIII")
+_NEIGHBOR = struct.Struct("!iH")
+_COUNT = struct.Struct("!Q")
+
+
+def _parse_address(address: str):
+    if address.startswith("unix:"):
+        return socket.AF_UNIX, address[len("unix:") :]
+
+    host, port = address.rsplit(":", 1)
+    return socket.AF_INET, (host, int(port))
+
+
+def _connect(address: str) -> socket.socket:
+    family, target = _parse_address(address)
+    sock = socket.socket(family, socket.SOCK_STREAM)
+
+    # The worker might still be starting up
+    for _ in range(100):
+        try:
+            sock.connect(target)
+            break
+        except (FileNotFoundError, ConnectionRefusedError):
+            time.sleep(0.05)
+    else:
+        sock.connect(target)
+
+    if family == socket.AF_INET:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    return sock
+
+
+def _listen(address: str) -> socket.socket:
+    family, target = _parse_address(address)
+    sock = socket.socket(family, socket.SOCK_STREAM)
+
+    if family == socket.AF_UNIX:
+        if os.path.exists(target):
+            os.remove(target)
+    else:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+
+    sock.bind(target)
+    sock.listen(8)
+    return sock
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:])
+        if not count:
+            raise ConnectionError("Connection closed by peer")
+        received += count
+    return bytes(buffer)
+
+
+def send_message(sock: socket.socket, kind: int, payload: bytes = b""):
+    sock.sendall(_HEADER.pack(kind, len(payload)) + payload)
+
+
+def recv_message(sock: socket.socket, expected: Optional[int] = None) -> Tuple[int, bytes]:
+    kind, size = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+    if expected is not None and kind != expected:
+        raise ConnectionError(f"Expected message {expected}, got {kind}")
+    return kind, _recv_exact(sock, size)
+
+
+def pack_rows(rows: List[int], width: int) -> bytes:
+    row_bytes = (width + 7) // 8
+    return b"".join(row.to_bytes(row_bytes, "little") for row in rows)
+
+
+def unpack_rows(data: bytes, width: int) -> List[int]:
+    row_bytes = (width + 7) // 8
+    if not row_bytes:
+        return []
+    return [int.from_bytes(data[i : i + row_bytes], "little") for i in range(0, len(data), row_bytes)]
+
+
+def _pack_bits(bits: int) -> bytes:
+    return bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+
+
+def block_layout(workers: int, width: int, height: int) -> Tuple[int, int]:
+    """
+    Choose how many blocks to use horizontally and vertically for a number of workers,
+    keeping the blocks as square as possible (less cells on the halos).
+    """
+    best = None
+    for columns in range(1, workers + 1):
+        if workers % columns:
+            continue
+        rows = workers // columns
+        if columns > width or rows > height:
+            continue
+
+        block_w, block_h = width / columns, height / rows
+        score = max(block_w, block_h) / min(block_w, block_h)
+        if best is None or score < best[0]:
+            best = (score, columns, rows)
+
+    if best is None:
+        raise ValueError(f"Can't split a {width}x{height} universe into {workers} blocks")
+    return best[1], best[2]
+
+
+def _split(length: int, parts: int) -> List[Tuple[int, int]]:
+    """
+    Split a length into (start, size) parts that differ in size by one at most.
+    """
+    bounds = [length * i // parts for i in range(parts + 1)]
+    return [(bounds[i], bounds[i + 1] - bounds[i]) for i in range(parts)]
+
+
+class Worker:
+    """
+    A worker owns a single block of the universe and exchanges its halos with
+    the workers that own the neighboring blocks.
+    """
+
+    def __init__(self, listener: socket.socket, coordinator: socket.socket):
+        self.listener = listener
+        self.coordinator = coordinator
+
+        self.rank = None
+        self.width = 0
+        self.height = 0
+        self.rows: List[int] = []
+
+        self.links: Dict[int, socket.socket] = {}
+
+    def assign(self, payload: bytes):
+        """
+        Receive the block and the neighbors' addresses, then connect to the neighbors.
+        """
+        self.rank, _, _, self.width, self.height = _GEOMETRY.unpack_from(payload)
+        offset = _GEOMETRY.size
+
+        neighbors = {}
+        for direction in (WEST, EAST, NORTH, SOUTH):
+            rank, size = _NEIGHBOR.unpack_from(payload, offset)
+            offset += _NEIGHBOR.size
+            address = payload[offset : offset + size].decode()
+            offset += size
+            if rank >= 0:
+                neighbors[rank] = (direction, address)
+
+        self.rows = unpack_rows(payload[offset:], self.width)
+
+        # The worker with the lower rank connects, the other one accepts
+        for rank, (direction, address) in neighbors.items():
+            if self.rank < rank:
+                sock = _connect(address)
+                send_message(sock, HELLO, struct.pack("!I", self.rank))
+                self.links[direction] = sock
+
+        for _ in [rank for rank in neighbors if rank < self.rank]:
+            sock, _ = self.listener.accept()
+            if sock.family == socket.AF_INET:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            _, hello = recv_message(sock, HELLO)
+            direction, _ = neighbors[struct.unpack("!I", hello)[0]]
+            self.links[direction] = sock
+
+    def exchange(self, outgoing: Dict[int, int]) -> Dict[int, int]:
+        """
+        Send a strip of bits to each linked neighbor and receive theirs.
+        Sending happens on separate threads, so that two workers sending to each
+        other at the same time can't block on full socket buffers.
+        """
+        threads = []
+        for direction, bits in outgoing.items():
+            if direction in self.links:
+                thread = Thread(
+                    target=send_message, args=(self.links[direction], HALO, _pack_bits(bits))
+                )
+                thread.start()
+                threads.append(thread)
+
+        incoming = {}
+        for direction in outgoing:
+            if direction in self.links:
+                _, payload = recv_message(self.links[direction], HALO)
+                incoming[direction] = int.from_bytes(payload, "little")
+
+        for thread in threads:
+            thread.join()
+        return incoming
+
+    def step(self):
+        """
+        Calculate the next generation of the block.
+        """
+        width = self.width
+        rows = self.rows
+
+        # Swap the west and east columns
+        west = 0
+        east = 0
+        for y, row in enumerate(rows):
+            west |= (row & 1) << y
+            east |= ((row >> (width - 1)) & 1) << y
+
+        halos = self.exchange({WEST: west, EAST: east})
+        west_halo = halos.get(WEST, 0)
+        east_halo = halos.get(EAST, 0)
+
+        extended = [
+            (row << 1) | ((west_halo >> y) & 1) | (((east_halo >> y) & 1) << (width + 1))
+            for y, row in enumerate(rows)
+        ]
+
+        # Swap the top and bottom rows, corners included
+        halos = self.exchange({NORTH: extended[0], SOUTH: extended[-1]})
+
+        extended = engine.step_rows(extended, width + 2, halos.get(NORTH, 0), halos.get(SOUTH, 0))
+
+        mask = (1 << width) - 1
+        self.rows = [(row >> 1) & mask for row in extended]
+
+    def run(self):
+        """
+        Serve the coordinator's requests until it sends SHUTDOWN.
+        """
+        while True:
+            kind, payload = recv_message(self.coordinator)
+
+            if kind == ASSIGN:
+                self.assign(payload)
+                send_message(self.coordinator, READY)
+            elif kind == STEP:
+                for _ in range(_COUNT.unpack(payload)[0]):
+                    self.step()
+                count = engine.population(self.rows)
+                send_message(self.coordinator, POPULATION, _COUNT.pack(count))
+            elif kind == GATHER:
+                send_message(self.coordinator, BLOCK, pack_rows(self.rows, self.width))
+            elif kind == SHUTDOWN:
+                break
+
+        for sock in self.links.values():
+            sock.close()
+        self.coordinator.close()
+
+
+def serve(address: str):
+    """
+    Start a worker listening on the address and serve a single coordinator.
+    """
+    listener = _listen(address)
+    coordinator, _ = listener.accept()
+
+    try:
+        Worker(listener, coordinator).run()
+    finally:
+        listener.close()
+        family, target = _parse_address(address)
+        if family == socket.AF_UNIX and os.path.exists(target):
+            os.remove(target)
+
+
+def spawn_local_workers(count: int, directory: str = None):
+    """
+    Start worker processes on this machine, listening on Unix sockets.
+
+    Returns:
+        tuple: The list of processes and the list of their addresses.
+    """
+    directory = directory or tempfile.mkdtemp(prefix="life-")
+    addresses = [f"unix:{os.path.join(directory, f'worker-{i}.sock')}" for i in range(count)]
+
+    processes = []
+    for address in addresses:
+        process = multiprocessing.Process(target=serve, args=(address,), daemon=True)
+        process.start()
+        processes.append(process)
+
+    return processes, addresses
+
+
+class Coordinator:
+    """
+    Splits a universe into blocks, one per worker, and drives the workers.
+
+    Attributes:
+        addresses (list): The addresses of the workers.
+        width (int): The width of the universe.
+        height (int): The height of the universe.
+        blocks_x (int): The number of blocks horizontally.
+        blocks_y (int): The number of blocks vertically.
+        generation (int): The current generation.
+    """
+
+    def __init__(self, addresses: List[str], width: int, height: int, layout=None):
+        self.addresses = addresses
+        self.width = width
+        self.height = height
+
+        self.blocks_x, self.blocks_y = layout or block_layout(len(addresses), width, height)
+        if self.blocks_x * self.blocks_y != len(addresses):
+            raise ValueError("The block layout must have one block per worker")
+
+        # Blocks are numbered row by row, the rank is also the index of the worker
+        self.blocks = [
+            (x, y, w, h)
+            for y, h in _split(height, self.blocks_y)
+            for x, w in _split(width, self.blocks_x)
+        ]
+
+        self.generation = 0
+        self.sockets = [_connect(address) for address in addresses]
+
+    def _neighbor(self, rank: int, direction: int) -> int:
+        offset_x, offset_y = _DIRECTIONS[direction]
+        column = rank % self.blocks_x + offset_x
+        row = rank // self.blocks_x + offset_y
+
+        if 0 <= column < self.blocks_x and 0 <= row < self.blocks_y:
+            return row * self.blocks_x + column
+        return -1
+
+    def load(self, universe: List[int]):
+        """
+        Place the blocks of a universe (rows as bit sets) on the workers.
+        """
+        for rank, (x, y, w, h) in enumerate(self.blocks):
+            mask = (1 << w) - 1
+            block = [(row >> x) & mask for row in universe[y : y + h]]
+
+            payload = _GEOMETRY.pack(rank, x, y, w, h)
+            for direction in (WEST, EAST, NORTH, SOUTH):
+                neighbor = self._neighbor(rank, direction)
+                address = self.addresses[neighbor].encode() if neighbor >= 0 else b""
+                payload += _NEIGHBOR.pack(neighbor, len(address)) + address
+
+            send_message(self.sockets[rank], ASSIGN, payload + pack_rows(block, w))
+
+        for sock in self.sockets:
+            recv_message(sock, READY)
+
+        self.generation = 0
+
+    def step(self, generations: int = 1) -> int:
+        """
+        Advance the universe and return the global population.
+        """
+        for sock in self.sockets:
+            send_message(sock, STEP, _COUNT.pack(generations))
+
+        population = 0
+        for sock in self.sockets:
+            _, payload = recv_message(sock, POPULATION)
+            population += _COUNT.unpack(payload)[0]
+
+        self.generation += generations
+        return population
+
+    def checkpoint(self) -> List[int]:
+        """
+        Collect the blocks from all workers and assemble the whole universe.
+        """
+        for sock in self.sockets:
+            send_message(sock, GATHER)
+
+        universe = [0] * self.height
+        for sock, (x, y, w, _) in zip(self.sockets, self.blocks):
+            _, payload = recv_message(sock, BLOCK)
+            for i, row in enumerate(unpack_rows(payload, w)):
+                universe[y + i] |= row << x
+
+        return universe
+
+    def close(self):
+        for sock in self.sockets:
+            send_message(sock, SHUTDOWN)
+            sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distributed Game of Life")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    worker_parser = commands.add_parser("worker", help="start a worker")
+    worker_parser.add_argument("address", help="host:port or unix:/path")
+
+    run_parser = commands.add_parser("run", help="run a universe on a set of workers")
+    run_parser.add_argument("pattern", nargs="?", help="pattern file, random soup if omitted")
+    run_parser.add_argument("--size", type=engine.parse_size, default=(600, 600), help="WxH")
+    run_parser.add_argument("--generations", type=int, default=100)
+    run_parser.add_argument("--report", type=int, default=10, help="generations per report")
+    run_parser.add_argument("--seed", type=int, default=None)
+    run_parser.add_argument("--blocks", type=engine.parse_size, default=None, help="CxR layout")
+    run_parser.add_argument("--workers", nargs="+", default=[], help="worker addresses")
+    run_parser.add_argument("--local", type=int, default=0, help="spawn local workers")
+    run_parser.add_argument(
+        "--verify", action="store_true", help="compare with the single-process engine"
+    )
+
+    args = parser.parse_args()
+
+    if args.command == "worker":
+        serve(args.address)
+        return
+
+    width, height = args.size
+    universe = engine.initial_rows(args.pattern, width, height, args.seed)
+
+    processes = []
+    addresses = list(args.workers)
+    if args.local:
+        processes, local_addresses = spawn_local_workers(args.local)
+        addresses += local_addresses
+
+    coordinator = Coordinator(addresses, width, height, args.blocks)
+    print(f"{coordinator.blocks_x}x{coordinator.blocks_y} blocks on {len(addresses)} workers")
+
+    start = time.perf_counter()
+    coordinator.load(universe)
+
+    while coordinator.generation < args.generations:
+        count = min(args.report, args.generations - coordinator.generation)
+        population = coordinator.step(count)
+        print(f"generation {coordinator.generation}: population {population}")
+
+    elapsed = time.perf_counter() - start
+    print(f"{args.generations / elapsed:.1f} generations/second")
+
+    if args.verify:
+        result = coordinator.checkpoint()
+        expected = engine.run(universe, width, args.generations)
+        print("verified" if result == expected else "MISMATCH with the single-process engine")
+
+    coordinator.close()
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,440 @@
+# This module provides a headless stepping kernel for Conway's Game of Life.
+#
+# The universe is stored as a list of rows, where every row is a Python integer
+# used as a bit set: bit x of row y is the cell (x, y). Python integers have
+# arbitrary precision, so a row can be as wide as needed, and bitwise operations
+# on them update a whole row at once instead of one cell at a time.
+#
+# The rules and the edges are the same as in life.Grid: the universe is bounded
+# and every cell outside of it is considered dead.
+
+import importlib
+import random
+import warnings
+
+from functools import reduce
+from operator import or_, xor
+from typing import Dict, Iterable, List, Tuple
+
+
+def _horizontal_sums(row: int, mask: int):
+    """
+    Returns the 2-bit sum (low, high) of each cell and its two horizontal neighbors.
+    """
+    left = (row << 1) & mask
+    right = row >> 1
+
+    low = left ^ row ^ right
+    high = (left & row) | (left & right) | (row & right)
+    return low, high
+
+
+def step_rows(
+    rows: List[int],
+    width: int,
+    above: int = 0,
+    below: int = 0,
+    counts: List[int] = None,
+    history=None,
+) -> List[int]:
+    """
+    Calculate the next generation of a block of rows.
+
+    Args:
+        rows (list): The rows of the block, as bit sets.
+        width (int): The number of cells in each row.
+        above (int): The row right above the block (halo), dead by default.
+        below (int): The row right below the block (halo), dead by default.
+        counts (list): If given, the population of the new rows, the number of cells
+            that changed and the union of the new rows are added to its three items,
+            while the rows are calculated (see step_stats).
+        history (heatmap.Heatmap): If given, the history of every row is updated with
+            the old and new row as soon as it's calculated (see Heatmap.track).
+
+    Returns:
+        list: The rows of the next generation.
+    """
+    mask = (1 << width) - 1
+    height = len(rows)
+    if not height:
+        return []
+
+    sums = [_horizontal_sums(row, mask) for row in rows]
+    sum_above = _horizontal_sums(above, mask)
+    sum_below = _horizontal_sums(below, mask)
+
+    counting = counts is not None
+    new_population = changed = columns = 0
+
+    tracking = history is not None
+    if tracking:
+        history.begin()
+        track = history.track
+
+    new_rows = []
+    for y, row in enumerate(rows):
+        up_low, up_high = sums[y - 1] if y > 0 else sum_above
+        down_low, down_high = sums[y + 1] if y < height - 1 else sum_below
+
+        # The middle row doesn't count the cell itself
+        left = (row << 1) & mask
+        right = row >> 1
+        mid_low = left ^ right
+        mid_high = left & right
+
+        # Ones column of the total and the carry into the twos column
+        ones = up_low ^ mid_low ^ down_low
+        carry = (up_low & mid_low) | (up_low & down_low) | (mid_low & down_low)
+
+        # The total is 2 or 3 when exactly one bit of the twos column is set
+        pair_a = up_high ^ mid_high
+        pair_b = down_high ^ carry
+        twice = (up_high & mid_high) | (down_high & carry)
+        twos = (pair_a ^ pair_b) & ~twice
+
+        new_row = twos & (ones | row)
+        new_rows.append(new_row)
+
+        if counting:
+            new_population += new_row.bit_count()
+            changed += (new_row ^ row).bit_count()
+            columns |= new_row
+
+        if tracking:
+            track(y, row, new_row)
+
+    if counting:
+        counts[0] += new_population
+        counts[1] += changed
+        counts[2] |= columns
+
+    return new_rows
+
+
+def bounding_box(rows: List[int], columns: int = None) -> Tuple[int, int, int, int]:
+    """
+    The (x, y, width, height) of the live cells, (0, 0, 0, 0) if there are none.
+    columns is the union of the rows, if it's already known.
+    """
+    if columns is None:
+        columns = reduce(or_, rows, 0)
+    if not columns:
+        return 0, 0, 0, 0
+
+    top = next(y for y, row in enumerate(rows) if row)
+    bottom = next(y for y in range(len(rows) - 1, -1, -1) if rows[y])
+    left = (columns & -columns).bit_length() - 1
+    return left, top, columns.bit_length() - left, bottom - top + 1
+
+
+def step_stats(rows: List[int], width: int, population: int, history=None) -> Tuple[List[int], tuple]:
+    """
+    Calculate the next generation and its statistics in the same pass.
+
+    Args:
+        rows (list): The universe, as bit sets.
+        width (int): The number of cells in each row.
+        population (int): The number of live cells in rows.
+        history (heatmap.Heatmap): If given, updated while stepping, see step_rows.
+
+    Returns:
+        tuple: The new rows and their (population, births, deaths, bounding box).
+    """
+    counts = [0, 0, 0]
+    new_rows = step_rows(rows, width, counts=counts, history=history)
+    new_population, changed, columns = counts
+
+    # Births minus deaths is the change of population, births plus deaths the changed cells
+    births = (changed + new_population - population) // 2
+    deaths = changed - births
+    return new_rows, (new_population, births, deaths, bounding_box(new_rows, columns))
+
+
+def diff_stats(old: List[int], new: List[int]) -> tuple:
+    """
+    The (population, births, deaths, bounding box) of new, compared to the previous
+    generation old. Used by backends that can't count while they step.
+    """
+    new_population = sum(map(int.bit_count, new))
+    changed = sum(map(int.bit_count, map(xor, old, new)))
+    births = (changed + new_population - sum(map(int.bit_count, old))) // 2
+    return new_population, births, changed - births, bounding_box(new)
+
+
+def run(rows: List[int], width: int, generations: int) -> List[int]:
+    """
+    Advance a whole universe by a number of generations.
+    """
+    for _ in range(generations):
+        rows = step_rows(rows, width)
+    return rows
+
+
+def bits(row: int):
+    """
+    Yields the position of every set bit of a row, in increasing order.
+    """
+    while row:
+        low = row & -row
+        yield low.bit_length() - 1
+        row ^= low
+
+
+def cells(rows: Iterable[int]):
+    """
+    Yields the (x, y) coordinates of every live cell of a universe.
+    """
+    for y, row in enumerate(rows):
+        for x in bits(row):
+            yield x, y
+
+
+def population(rows: Iterable[int]) -> int:
+    """
+    Count the live cells of a universe.
+    """
+    return sum(row.bit_count() for row in rows)
+
+
+def random_rows(width: int, height: int, seed: int = None) -> List[int]:
+    """
+    Create a random soup, every cell has a 50% chance of being alive.
+    """
+    generator = random.Random(seed)
+    return [generator.getrandbits(width) for _ in range(height)]
+
+
+def rows_from_layout(layout: List[list], width: int, height: int, x: int = None, y: int = None):
+    """
+    Convert a pattern layout (rows of booleans) into a universe of the given size.
+    The pattern's top-left corner is placed at (x, y), or centered if omitted.
+    Cells that fall outside of the universe are dropped.
+    """
+    if x is None:
+        x = (width - max((len(row) for row in layout), default=0)) // 2
+    if y is None:
+        y = (height - len(layout)) // 2
+
+    rows = [0] * height
+    for i, layout_row in enumerate(layout):
+        if not 0 <= y + i < height:
+            continue
+        row = 0
+        for j, alive in enumerate(layout_row):
+            if alive and 0 <= x + j < width:
+                row |= 1 << (x + j)
+        rows[y + i] = row
+    return rows
+
+
+def place_rows(
+    rows: List[int], pattern_width: int, width: int, height: int, x: int = None, y: int = None
+) -> List[int]:
+    """
+    Place a pattern given as bit rows in a universe of the given size, like rows_from_layout.
+    """
+    if x is None:
+        x = (width - pattern_width) // 2
+    if y is None:
+        y = (height - len(rows)) // 2
+
+    mask = (1 << width) - 1
+    universe = [0] * height
+    for i, row in enumerate(rows):
+        if 0 <= y + i < height:
+            universe[y + i] = (row << x if x >= 0 else row >> -x) & mask
+    return universe
+
+
+def parse_size(text: str) -> Tuple[int, int]:
+    """
+    Parse a size written as WxH (e.g. 200x100), for the command line tools.
+    """
+    width, height = text.lower().split("x")
+    return int(width), int(height)
+
+
+def initial_rows(pattern_path: str, width: int, height: int, seed: int = None) -> List[int]:
+    """
+    The starting universe of the command line tools: the pattern file centered in the
+    universe, or a random soup if no pattern is given. Only the part of the pattern that
+    fits in the universe is expanded (see life.Pattern.window).
+    """
+    if not pattern_path:
+        return random_rows(width, height, seed)
+
+    import formats
+
+    pattern = formats.read(pattern_path)
+    x, y = (width - pattern.width) // 2, (height - pattern.size) // 2
+    return pattern.window(-x, -y, width, height)
+
+
+def layout_from_rows(rows: List[int], width: int) -> List[list]:
+    """
+    Convert a universe back into a pattern layout (rows of 0 and 1).
+    """
+    return [[(row >> x) & 1 for x in range(width)] for row in rows]
+
+
+# Backends
+#
+# life.Grid keeps its state in a backend, chosen by name. Backends are registered
+# with the register decorator, and create picks one by name. Backends that need an
+# optional dependency live in their own module, imported the first time they are asked for.
+
+BACKENDS: Dict[str, type] = {}
+
+DEFAULT_BACKEND = "bitrow"
+
+# Backend name -> module that registers it, if its dependencies are installed
+OPTIONAL_BACKENDS: Dict[str, str] = {"numba": "jit"}
+
+
+def register(name: str):
+    """
+    Class decorator that makes a backend available under a name.
+    """
+
+    def decorator(cls):
+        cls.name = name
+        BACKENDS[name] = cls
+        return cls
+
+    return decorator
+
+
+def create(name: str, width: int, height: int) -> "Backend":
+    """
+    Create a backend by name. Optional backends whose dependencies are missing
+    fall back to the default backend with a warning.
+    """
+    if name not in BACKENDS and name in OPTIONAL_BACKENDS:
+        importlib.import_module(OPTIONAL_BACKENDS[name])
+        if name not in BACKENDS:
+            warnings.warn(f"The '{name}' backend is not available, using '{DEFAULT_BACKEND}'")
+            name = DEFAULT_BACKEND
+
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend '{name}', expected one of {', '.join(BACKENDS)}")
+    return BACKENDS[name](width, height)
+
+
+class Backend:
+    """
+    Base class of the stepping backends. A backend owns the state of a bounded
+    universe of width x height cells and knows how to advance it.
+    """
+
+    name = None
+
+    def __init__(self, width: int, height: int):
+        self.width = width
+        self.height = height
+
+    def load_rows(self, rows: List[int]):
+        """
+        Replace the state with a list of rows (bit x of row y is the cell (x, y)).
+        """
+        raise NotImplementedError
+
+    def to_rows(self) -> List[int]:
+        raise NotImplementedError
+
+    def get(self, x: int, y: int) -> bool:
+        raise NotImplementedError
+
+    def set(self, x: int, y: int, alive: bool):
+        raise NotImplementedError
+
+    def step(self, generations: int = 1):
+        raise NotImplementedError
+
+    def step_stats(self, history=None) -> tuple:
+        """
+        Advance one generation and return its (population, births, deaths, bounding box).
+        The history (heatmap.Heatmap), if given, is updated as well.
+        Backends override this to count while they step, this one compares the rows.
+        """
+        old = self.to_rows()
+        self.step()
+        new = self.to_rows()
+        if history is not None:
+            history.update(old, new)
+        return diff_stats(old, new)
+
+    def step_history(self, history):
+        """
+        Advance one generation and update a history (heatmap.Heatmap).
+        Backends override this to update it while they step, this one compares the rows.
+        """
+        old = self.to_rows()
+        self.step()
+        history.update(old, self.to_rows())
+
+    def live_cells(self):
+        """
+        Yields the (x, y) coordinates of every live cell.
+        """
+        return cells(self.to_rows())
+
+    def population(self) -> int:
+        return population(self.to_rows())
+
+    def clear(self):
+        self.load_rows([0] * self.height)
+
+
+@register("bitrow")
+class BitRowBackend(Backend):
+    """
+    Rows stored as Python integers and updated with step_rows.
+    """
+
+    def __init__(self, width: int, height: int):
+        super().__init__(width, height)
+        self.rows = [0] * height
+
+        # The population, when it's known without counting (see step_stats)
+        self.known_population = 0
+
+    def load_rows(self, rows: List[int]):
+        mask = (1 << self.width) - 1
+        self.rows = [row & mask for row in rows]
+        self.known_population = None
+
+    def to_rows(self) -> List[int]:
+        return list(self.rows)
+
+    def get(self, x: int, y: int) -> bool:
+        return bool((self.rows[y] >> x) & 1)
+
+    def set(self, x: int, y: int, alive: bool):
+        if alive:
+            self.rows[y] |= 1 << x
+        else:
+            self.rows[y] &= ~(1 << x)
+        self.known_population = None
+
+    def step(self, generations: int = 1):
+        for _ in range(generations):
+            self.rows = step_rows(self.rows, self.width)
+        self.known_population = None
+
+    def step_stats(self, history=None) -> tuple:
+        if self.known_population is None:
+            self.known_population = population(self.rows)
+
+        self.rows, stats = step_stats(self.rows, self.width, self.known_population, history)
+        self.known_population = stats[0]
+        return stats
+
+    def step_history(self, history):
+        self.rows = step_rows(self.rows, self.width, history=history)
+        self.known_population = None
+
+    def live_cells(self):
+        return cells(self.rows)
+
+    def population(self) -> int:
+        return population(self.rows)
@@ -0,0 +1,259 @@
+# This module reads and writes patterns in the common Life file formats:
+#   RLE (.rle)            see rle.py
+#   Plaintext (.cells)    '!' comments ('!Name: ...'), then one line per row, 'O' is alive
+#   Life 1.05 (.lif)      '#Life 1.05', '#D' comments, '#N' (normal rules), then
+#                         '#P x y' blocks of '.' and '*'
+#   Life 1.06 (.lif)      '#Life 1.06', then the 'x y' coordinates of every live cell
+#   Macrocell (.mc)       see macrocell.py
+#
+# The format is chosen by the extension of the file, or by its first line when the
+# extension is unknown or shared (.lif and .life are used for both Life 1.05 and 1.06).
+# Every reader decodes the file line by line straight into bit rows (see engine.py),
+# except Macrocell files: they are read as a quadtree, and only the rows (or the window
+# of them, see life.Pattern.window) that are used are ever expanded.
+#
+# Usage:
+#   python formats.py patterns/glider.rle glider.cells
+
+import argparse
+import os
+
+import engine
+import macrocell
+import rle
+
+from itertools import chain
+from life import Pattern
+from typing import Callable, Dict, Iterable, Iterator, Tuple
+
+
+class _Rows:
+    """
+    Bit rows that can grow in every direction, for formats with arbitrary coordinates.
+    Each row is stored with its own left edge, so negative x never needs a shift of everything.
+    """
+
+    def __init__(self):
+        self.rows: Dict[int, Tuple[int, int]] = {}
+
+    def add(self, x: int, y: int, row: int):
+        if not row:
+            return
+        bits, left = self.rows.get(y, (0, x))
+        if x < left:
+            bits, left = bits << (left - x), x
+        self.rows[y] = (bits | (row << (x - left)), left)
+
+    def to_pattern(self, name: str) -> Pattern:
+        if not self.rows:
+            return Pattern.from_rows(name, [], 0)
+
+        left = min(left + ((bits & -bits).bit_length() - 1) for bits, left in self.rows.values())
+        top = min(self.rows)
+        rows = [0] * (max(self.rows) - top + 1)
+        for y, (bits, row_left) in self.rows.items():
+            rows[y - top] = (
+                bits << (row_left - left) if row_left >= left else bits >> (left - row_left)
+            )
+
+        return Pattern.from_rows(name, rows, max(row.bit_length() for row in rows))
+
+
+def _text_row(text: str, alive: str) -> int:
+    row = 0
+    for x, char in enumerate(text):
+        if char in alive:
+            row |= 1 << x
+    return row
+
+
+# Plaintext
+
+
+def decode_plaintext(lines: Iterable[str]) -> Pattern:
+    name = "Unknown Pattern"
+    rows = []
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if line.startswith("!"):
+            if line.startswith("!Name:"):
+                name = line[6:].strip()
+            continue
+        rows.append(_text_row(line, "O*"))
+
+    # Trailing blank lines aren't part of the pattern
+    while rows and not rows[-1]:
+        rows.pop()
+    return Pattern.from_rows(name, rows, max((row.bit_length() for row in rows), default=0))
+
+
+def encode_plaintext(pattern: Pattern) -> Iterator[str]:
+    yield f"!Name: {pattern.name}"
+    for row in pattern.rows:
+        yield "".join(".O"[(row >> x) & 1] for x in range(row.bit_length()))
+
+
+# Life 1.05
+
+
+def decode_life105(lines: Iterable[str]) -> Pattern:
+    name = "Unknown Pattern"
+    rows = _Rows()
+    x = y = 0
+    for line in lines:
+        line = line.strip()
+        if line.startswith("#"):
+            if line.startswith("#P"):
+                x, y = map(int, line[2:].split())
+            elif line.startswith("#D Name:"):
+                name = line[8:].strip()
+            continue
+        rows.add(x, y, _text_row(line, "*"))
+        y += 1
+    return rows.to_pattern(name)
+
+
+def encode_life105(pattern: Pattern) -> Iterator[str]:
+    yield "#Life 1.05"
+    yield f"#D Name: {pattern.name}"
+    yield "#N"
+    yield f"#P {-(pattern.width // 2)} {-(pattern.size // 2)}"
+    for row in pattern.rows:
+        yield "".join(".*"[(row >> x) & 1] for x in range(row.bit_length())) or "."
+
+
+# Life 1.06
+
+
+def decode_life106(lines: Iterable[str]) -> Pattern:
+    name = "Unknown Pattern"
+    rows = _Rows()
+    for line in lines:
+        line = line.strip()
+        if line.startswith("#"):
+            if line.startswith("#D Name:"):
+                name = line[8:].strip()
+            continue
+        if line:
+            x, y = map(int, line.split())
+            rows.add(x, y, 1)
+    return rows.to_pattern(name)
+
+
+def encode_life106(pattern: Pattern) -> Iterator[str]:
+    yield "#Life 1.06"
+    for x, y in engine.cells(pattern.rows):
+        yield f"{x} {y}"
+
+
+# Macrocell
+
+
+def decode_macrocell(lines: Iterable[str]) -> Pattern:
+    return macrocell.decode_lines(lines).to_pattern()
+
+
+def encode_macrocell(pattern: Pattern) -> Iterator[str]:
+    tree = macrocell.Macrocell.from_rows(pattern.rows, pattern.width, pattern.name)
+    return macrocell.encode_lines(tree)
+
+
+# Formats
+
+READERS: Dict[str, Callable[[Iterable[str]], Pattern]] = {
+    "rle": rle.decode_lines,
+    "plaintext": decode_plaintext,
+    "life105": decode_life105,
+    "life106": decode_life106,
+    "macrocell": decode_macrocell,
+}
+
+WRITERS: Dict[str, Callable[[Pattern], Iterator[str]]] = {
+    "rle": rle.encode_lines,
+    "plaintext": encode_plaintext,
+    "life105": encode_life105,
+    "life106": encode_life106,
+    "macrocell": encode_macrocell,
+}
+
+# .lif and .life are both Life 1.05 and Life 1.06, the first line tells them apart
+EXTENSIONS = {
+    ".rle": "rle",
+    ".cells": "plaintext",
+    ".lif": "life106",
+    ".life": "life106",
+    ".mc": "macrocell",
+}
+
+
+def sniff(first_line: str) -> str:
+    """
+    Guess the format of a file from its first line, RLE if nothing else matches.
+    """
+    line = first_line.strip()
+    if line.startswith("#Life 1.05"):
+        return "life105"
+    if line.startswith("#Life 1.06"):
+        return "life106"
+    if line.startswith("[M2]"):
+        return "macrocell"
+    if line.startswith("!"):
+        return "plaintext"
+    return "rle"
+
+
+def format_of(file_path: str, first_line: str = None) -> str:
+    """
+    The format of a file, from its first line if it has a header, otherwise from its extension.
+    """
+    if first_line is not None:
+        sniffed = sniff(first_line)
+        if sniffed != "rle" or first_line.lstrip().startswith(("#", "x")):
+            return sniffed
+
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension not in EXTENSIONS:
+        if first_line is None:
+            raise ValueError(f"Unknown pattern format '{extension}'")
+        return "rle"
+    return EXTENSIONS[extension]
+
+
+def read(file_path: str) -> Pattern:
+    """
+    Read a pattern file of any supported format.
+    """
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"File '{file_path}' not found")
+
+    with open(file_path, "r") as file:
+        first_line = file.readline()
+        kind = format_of(file_path, first_line)
+        # The first line is given back to the reader, the rest is streamed
+        return READERS[kind](chain([first_line], file))
+
+
+def write(pattern: Pattern, file_path: str, kind: str = None):
+    """
+    Write a pattern file, in the format of its extension unless one is given.
+    """
+    kind = kind or format_of(file_path)
+    with open(file_path, "w") as file:
+        for line in WRITERS[kind](pattern):
+            file.write(line + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert a pattern between file formats")
+    parser.add_argument("input")
+    parser.add_argument("output")
+    parser.add_argument("--format", choices=list(WRITERS), help="defaults to the extension")
+    args = parser.parse_args()
+
+    pattern = read(args.input)
+    write(pattern, args.output, args.format)
+    print(f"{pattern.name}: {pattern.width}x{pattern.size}, {engine.population(pattern.rows)} cells")
+
+
+if __name__ == "__main__":
+    main()
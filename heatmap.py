@@ -0,0 +1,204 @@
+# This module keeps the history of every cell of a universe, for the display modes of
+# the grid (see life.Grid.draw):
+#   age:      for how many generations each cell has been alive
+#   changed:  how many generations ago each cell last changed
+#   activity: the changes of each cell over the last 8 generations, the latest weighs
+#             the most, so the heat of a change fades by half every generation
+#
+# The history is stored like the universe (see engine.py), as bit planes: a counter of
+# 8 bits is 8 ints per row, and bit x of plane k of row y is bit k of the counter of the
+# cell (x, y). The counters saturate at 255. They are updated row by row while a
+# generation is calculated (engine.step_rows calls Heatmap.track with the old and the
+# new row), with a few bitwise operations per row. Rows where nothing happens, and
+# cells whose counter is already at 255, cost next to nothing.
+#
+# A map is only expanded to one byte per cell when it's shown (see Heatmap.map): the
+# bytes are the pixels of an 8-bit image whose palette (a lookup table of 256 colors,
+# see PALETTES) turns the values into colors.
+
+from typing import Dict, List, Tuple
+
+MODES = ("age", "changed", "activity")
+
+# The number of bit planes of every map, the values go from 0 to 2^BITS - 1
+BITS = 8
+
+# Binary digits -> the value of bit k of a byte, to expand plane k of a map
+_PLANE_BYTES = [bytes.maketrans(b"01", bytes([0, 1 << k])) for k in range(BITS)]
+
+
+def _gradient(stops: List[Tuple[int, Tuple[int, int, int]]]) -> List[Tuple[int, int, int]]:
+    """
+    A palette of 256 colors, interpolated between (index, color) stops.
+    """
+    palette = []
+    for (start, low), (end, high) in zip(stops, stops[1:]):
+        for index in range(start, end):
+            t = (index - start) / (end - start)
+            palette.append(tuple(round(a + (b - a) * t) for a, b in zip(low, high)))
+    palette.append(stops[-1][1])
+    return palette
+
+
+# Dead cells are 0 in the age map, but long unchanged cells are 255 in the changed map
+PALETTES: Dict[str, List[Tuple[int, int, int]]] = {
+    "age": [(0, 0, 0)] + _gradient([(1, (255, 255, 160)), (32, (230, 110, 40)), (255, (90, 20, 60))]),
+    "changed": _gradient(
+        [(0, (255, 255, 255)), (8, (100, 120, 175)), (64, (20, 30, 60)), (255, (0, 0, 0))]
+    ),
+    "activity": _gradient(
+        [
+            (0, (0, 0, 0)),
+            (32, (120, 0, 40)),
+            (96, (230, 90, 20)),
+            (192, (255, 220, 80)),
+            (255, (255, 255, 255)),
+        ]
+    ),
+}
+
+
+def _digits(rows: List[int], width: int) -> bytes:
+    """
+    One byte per cell of a universe, row by row: b"1" for the set bits, b"0" for the others.
+    Translation tables then turn them into any two values.
+    """
+    digits = f"0{width}b"
+    return "".join(format(row, digits)[::-1] for row in rows).encode()
+
+
+def _count(planes: List[int], keep: int, full: int, clear: bool) -> int:
+    """
+    Add 1 to the counters (bit planes of a row) of the cells in keep, and reset the others
+    to 0 if clear is set (otherwise they must already be 0). full is the cells whose counter
+    is at its maximum, they are left as they are.
+
+    Returns:
+        int: The cells whose counter is now at its maximum.
+    """
+    full &= keep
+    carry = keep ^ full
+    if not carry and not clear:
+        return full
+
+    for k in range(BITS):
+        plane = planes[k] & keep
+        planes[k] = plane ^ carry
+        carry &= plane
+        if not carry and not clear:
+            break
+
+    # The counters that went past the maximum are set back to it, and stay there
+    if carry:
+        for k in range(BITS):
+            planes[k] |= carry
+        full |= carry
+    return full
+
+
+class Heatmap:
+    """
+    The age, changed and activity maps of a universe, see the module description.
+
+    Attributes:
+        width (int): The width of the universe.
+        height (int): The height of the universe.
+        age (list): The bit planes of the age counters of every row.
+        since (list): The bit planes of the changed counters of every row.
+        activity (list): The bit planes of the activity, each one a list of rows.
+        version (int): Incremented whenever the maps change.
+    """
+
+    def __init__(self, width: int, height: int, rows: List[int] = None):
+        self.width = width
+        self.height = height
+        self.mask = (1 << width) - 1
+        self.version = 0
+        self.reset(rows or [0] * height)
+
+    def reset(self, rows: List[int]):
+        """
+        Forget the history, the live cells of rows start with an age of 1.
+        """
+        self.age = [[row] + [0] * (BITS - 1) for row in rows]
+        self.age_full = [0] * self.height
+        self.since = [[self.mask] * BITS for _ in range(self.height)]
+        self.since_full = [self.mask] * self.height
+        self.activity = [[0] * self.height for _ in range(BITS)]
+        self.version += 1
+        self._maps: Dict[str, Tuple[int, bytes]] = {}
+
+    def begin(self):
+        """
+        Start a generation: the activity of the previous ones is halved (its planes move
+        down by one), then track is called for every row.
+        """
+        self.activity = self.activity[1:] + [[0] * self.height]
+        self.version += 1
+
+    def track(self, y: int, row: int, new_row: int):
+        """
+        Update the counters of row y, which went from row to new_row.
+        """
+        changed = row ^ new_row
+        if changed:
+            self.activity[-1][y] = changed
+
+        # Live cells get older, dead ones are 0 (they only need clearing when cells die)
+        if row | new_row:
+            self.age_full[y] = _count(self.age[y], new_row, self.age_full[y], changed & row)
+
+        self.since_full[y] = _count(self.since[y], self.mask ^ changed, self.since_full[y], changed)
+
+    def update(self, old: List[int], new: List[int]):
+        """
+        Update the maps after a generation, from the rows before and after it.
+        For the backends that don't call track while they step.
+        """
+        self.begin()
+        for y, (row, new_row) in enumerate(zip(old, new)):
+            self.track(y, row, new_row)
+
+    def edit(self, old: List[int], new: List[int]):
+        """
+        Update the maps after cells were set by hand, not by a generation: the cells that
+        differ between old and new have just changed, the new live ones have an age of 1.
+        """
+        for y, (row, new_row) in enumerate(zip(old, new)):
+            changed = row ^ new_row
+            if not changed:
+                continue
+
+            age, since = self.age[y], self.since[y]
+            for k in range(BITS):
+                age[k] &= ~changed
+                since[k] &= ~changed
+            age[0] |= changed & new_row
+            self.age_full[y] &= ~changed
+            self.since_full[y] &= ~changed
+            self.activity[-1][y] |= changed
+        self.version += 1
+
+    def map(self, mode: str) -> bytes:
+        """
+        One byte per cell (row by row) with the values of a map, built when it's asked for.
+        """
+        cached = self._maps.get(mode)
+        if cached is not None and cached[0] == self.version:
+            return cached[1]
+
+        if mode == "activity":
+            planes = self.activity
+        else:
+            counters = self.age if mode == "age" else self.since
+            planes = [[row[k] for row in counters] for k in range(BITS)]
+
+        # Each plane gives one bit of every byte, so they are combined with OR
+        value = 0
+        for k, rows in enumerate(planes):
+            if any(rows):
+                value |= int.from_bytes(_digits(rows, self.width).translate(_PLANE_BYTES[k]), "big")
+
+        data = value.to_bytes(self.width * self.height, "big")
+        self._maps[mode] = (self.version, data)
+        return data
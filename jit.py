@@ -0,0 +1,136 @@
+# This module provides an optional backend compiled with Numba (pip install numba).
+#
+# The universe is a 2D array of bytes (one per cell). The kernel counts the neighbors
+# and applies the rules in a single pass, without temporary arrays, and the rows are
+# split between threads (numba.prange). Set NUMBA_NUM_THREADS to limit the threads.
+# Each row also gets its population, births, deaths and live columns counted in the
+# same pass, for the statistics (see engine.Backend.step_stats).
+#
+# The compiled kernel is cached on disk (in __pycache__, or in NUMBA_CACHE_DIR), so it
+# is only compiled the first time, not every time the game starts.
+#
+# The backend is registered as "numba" when Numba is installed. Otherwise nothing is
+# registered and engine.create falls back to the default backend.
+
+import engine
+
+from typing import List
+
+try:
+    import numba
+    import numpy as np
+except ImportError:
+    numba = None
+
+
+# Columns of the per-row counts
+ALIVE, BIRTHS, DEATHS, LEFT, RIGHT = range(5)
+
+
+def _kernel(cells, out, counts):
+    """
+    Write the next generation of cells into out. Cells outside of the grid are dead.
+    counts[y] is set to the population, births, deaths, first and last live x of row y.
+    """
+    height, width = cells.shape
+    for y in numba.prange(height):
+        top = max(y - 1, 0)
+        bottom = min(y + 2, height)
+
+        alive = births = deaths = 0
+        first = last = -1
+        for x in range(width):
+            left = max(x - 1, 0)
+            right = min(x + 2, width)
+
+            count = 0
+            for j in range(top, bottom):
+                for i in range(left, right):
+                    count += cells[j, i]
+            count -= cells[y, x]
+
+            new = 1 if count == 3 or (count == 2 and cells[y, x]) else 0
+            out[y, x] = new
+
+            if new:
+                alive += 1
+                last = x
+                if first < 0:
+                    first = x
+            if new != cells[y, x]:
+                births += new
+                deaths += 1 - new
+
+        counts[y, ALIVE] = alive
+        counts[y, BIRTHS] = births
+        counts[y, DEATHS] = deaths
+        counts[y, LEFT] = first
+        counts[y, RIGHT] = last
+
+
+if numba is not None:
+    _step = numba.njit(parallel=True, cache=True, nogil=True)(_kernel)
+
+    @engine.register("numba")
+    class NumbaBackend(engine.Backend):
+        """
+        Cells stored as a NumPy array of bytes, advanced by a compiled kernel.
+        """
+
+        def __init__(self, width: int, height: int):
+            super().__init__(width, height)
+            self.cells = np.zeros((height, width), dtype=np.uint8)
+            self.spare = np.zeros_like(self.cells)
+            self.counts = np.zeros((height, 5), dtype=np.int64)
+            self.row_bytes = (width + 7) // 8
+
+        def load_rows(self, rows: List[int]):
+            self.cells[:] = 0
+            for y, row in enumerate(rows[: self.height]):
+                data = np.frombuffer(row.to_bytes(self.row_bytes, "little"), dtype=np.uint8)
+                self.cells[y] = np.unpackbits(data, bitorder="little")[: self.width]
+
+        def to_rows(self) -> List[int]:
+            packed = np.packbits(self.cells, axis=1, bitorder="little")
+            return [int.from_bytes(row.tobytes(), "little") for row in packed]
+
+        def get(self, x: int, y: int) -> bool:
+            return bool(self.cells[y, x])
+
+        def set(self, x: int, y: int, alive: bool):
+            self.cells[y, x] = alive
+
+        def step(self, generations: int = 1):
+            for _ in range(generations):
+                _step(self.cells, self.spare, self.counts)
+                self.cells, self.spare = self.spare, self.cells
+
+        def step_stats(self, history=None) -> tuple:
+            if history is not None:
+                return super().step_stats(history)
+
+            self.step()
+            counts = self.counts
+
+            population = int(counts[:, ALIVE].sum())
+            births = int(counts[:, BIRTHS].sum())
+            deaths = int(counts[:, DEATHS].sum())
+            if not population:
+                return population, births, deaths, (0, 0, 0, 0)
+
+            occupied = np.nonzero(counts[:, ALIVE])[0]
+            top, bottom = int(occupied[0]), int(occupied[-1])
+            left = int(counts[occupied, LEFT].min())
+            right = int(counts[occupied, RIGHT].max())
+            box = (left, top, right - left + 1, bottom - top + 1)
+            return population, births, deaths, box
+
+        def live_cells(self):
+            ys, xs = np.nonzero(self.cells)
+            return zip(xs.tolist(), ys.tolist())
+
+        def population(self) -> int:
+            return int(np.count_nonzero(self.cells))
+
+        def clear(self):
+            self.cells[:] = 0
@@ -1,7 +1,10 @@
 import pygame
-import random
+import time
 
-from typing import List
+import engine
+import heatmap
+
+from typing import Callable, List
 
 
 class Cell:
@@ -82,11 +85,85 @@ class Cell:
 
 
 class Pattern:
+    """
+    A named pattern. The cells are stored either as a layout (rows of booleans)
+    or as bit rows (see engine.py), and each one is built from the other when needed.
+    A lazy pattern only has its size until then, its rows are read the first time.
+
+    Attributes:
+        name (str): The name of the pattern.
+        width (int): The number of columns of the pattern.
+        size (int): The number of rows of the pattern.
+    """
+
     def __init__(self, name: str, layout: list = [[bool]]):
         self.name = name
-        self.layout = layout
+        self._layout = layout
+        self._rows = None
+        self._source: Callable[[], List[int]] = None
+        self._window: Callable[[int, int, int, int], List[int]] = None
+        self.width = max((len(row) for row in layout), default=0)
         self.size = len(layout)
 
+        # Period, speed, population range, etc. filled in by analysis.PatternLibrary
+        self.metadata: dict = {}
+
+    @classmethod
+    def from_rows(cls, name: str, rows: List[int], width: int):
+        """
+        Create a pattern from bit rows, without building its layout.
+        """
+        pattern = cls(name, [])
+        pattern._layout = None
+        pattern._rows = rows
+        pattern.width = width
+        pattern.size = len(rows)
+        return pattern
+
+    @classmethod
+    def lazy(
+        cls,
+        name: str,
+        width: int,
+        size: int,
+        source: Callable[[], List[int]],
+        window: Callable[[int, int, int, int], List[int]] = None,
+    ):
+        """
+        Create a pattern whose rows are only read (by calling source) when they are used.
+        If given, window(x, y, width, height) reads a part of them, see Pattern.window.
+        """
+        pattern = cls.from_rows(name, [], width)
+        pattern._rows = None
+        pattern._source = source
+        pattern._window = window
+        pattern.size = size
+        return pattern
+
+    @property
+    def layout(self) -> list:
+        if self._layout is None:
+            self._layout = engine.layout_from_rows(self.rows, self.width)
+        return self._layout
+
+    @property
+    def rows(self) -> List[int]:
+        if self._rows is None and self._source is not None:
+            self._rows = self._source()
+        elif self._rows is None:
+            self._rows = engine.rows_from_layout(self._layout, self.width, self.size, 0, 0)
+        return self._rows
+
+    def window(self, x: int, y: int, width: int, height: int) -> List[int]:
+        """
+        The bit rows of a window of the pattern, whose top-left corner is the cell (x, y)
+        of the pattern (it can be outside of it). Lazy patterns that can read a part of
+        their cells (e.g. Macrocell files) never build the rest.
+        """
+        if self._rows is None and self._window is not None:
+            return self._window(x, y, width, height)
+        return engine.place_rows(self.rows, self.width, width, height, -x, -y)
+
     def at(self, x: int, y: int):
         return self.layout[x][y]
 
@@ -100,15 +177,17 @@ class Pattern:
                     pygame.draw.rect(screen, color, rect)
 
 
-class Grid:
-    def __init__(self, cell_size, cells_w, cells_h, offset_x, offset_y):
-        self.cells = [
-            [
-                Cell(x, y, cell_size, bool(random.getrandbits(1)), offset_x, offset_y)
-                for y in range(cells_h)
-            ]
-            for x in range(cells_w)
-        ]
+@engine.register("cells")
+class CellBackend(engine.Backend):
+    """
+    The original backend: one Cell object per cell, each one with its list of neighbors.
+    Much slower than the bit based backends, but every cell can be inspected.
+    """
+
+    def __init__(self, width: int, height: int):
+        super().__init__(width, height)
+
+        self.cells = [[Cell(x, y, 1, False, 0, 0) for y in range(height)] for x in range(width)]
 
         for row in self.cells:
             for cell in row:
@@ -126,31 +205,203 @@ class Grid:
                 ):
                     cell.neighbors.append(self.cells[x + i][y + j])
 
-    def calculate_neighbors(self, current_thread=0, total_threads=1):
-        start = current_thread * ((len(self.cells) ** 2) // total_threads)
-        stop = (current_thread + 1) * ((len(self.cells) ** 2) // total_threads)
+    def load_rows(self, rows):
+        for x, column in enumerate(self.cells):
+            for y, cell in enumerate(column):
+                cell.alive = bool((rows[y] >> x) & 1)
+                cell.next_status = cell.alive
 
-        for i in range(start, stop):
-            self.cells[i // len(self.cells)][i % len(self.cells)].calculate_neighbors()
+    def to_rows(self):
+        rows = [0] * self.height
+        for x, column in enumerate(self.cells):
+            for y, cell in enumerate(column):
+                if cell.alive:
+                    rows[y] |= 1 << x
+        return rows
 
-    def evolve(self, surface: pygame.Surface):
-        for row in self.cells:
-            for cell in row:
-                cell.evolve()
-                cell.draw(surface)
+    def get(self, x: int, y: int) -> bool:
+        return self.cells[x][y].alive
+
+    def set(self, x: int, y: int, alive: bool):
+        self.cells[x][y].alive = alive
+        self.cells[x][y].next_status = alive
+
+    def step(self, generations: int = 1):
+        for _ in range(generations):
+            for row in self.cells:
+                for cell in row:
+                    cell.calculate_neighbors()
+
+            for row in self.cells:
+                for cell in row:
+                    cell.evolve()
+
+
+class Grid:
+    """
+    The grid of cells shown on the screen. The state is kept by a backend
+    (see engine.BACKENDS), the grid draws it and counts the generations.
+
+    Attributes:
+        cell_size (int): The size of a cell on the screen, in pixels.
+        width (int): The number of cells horizontally.
+        height (int): The number of cells vertically.
+        generation (int): The number of generations since the grid was created.
+        backend (engine.Backend): The backend that stores and advances the cells.
+        stats (stats.StatsStream): If set, receives the statistics of every generation,
+            counted by the backend while it steps.
+        heatmap (heatmap.Heatmap): If set, the history of the cells, updated by the
+            backend every generation.
+        display_mode (str): "position" to color the live cells by their position,
+            or one of heatmap.MODES to show a map of the heatmap, see set_display_mode.
+    """
+
+    def __init__(
+        self, cell_size, cells_w, cells_h, offset_x, offset_y, backend=engine.DEFAULT_BACKEND
+    ):
+        self.cell_size = cell_size
+        self.width = cells_w
+        self.height = cells_h
+        self.offset_x = offset_x
+        self.offset_y = offset_y
+
+        self.generation = 0
+
+        self.backend = engine.create(backend, cells_w, cells_h)
+        self.backend.load_rows(engine.random_rows(cells_w, cells_h))
+
+        self.stats = None
+        self.heatmap = None
+        self.display_mode = "position"
+
+    def step(self, generations: int = 1):
+        if self.stats is None and self.heatmap is None:
+            self.backend.step(generations)
+            self.generation += generations
+            return
+
+        # The heatmap is updated by the backend while it steps
+        for _ in range(generations):
+            if self.stats is None:
+                self.backend.step_history(self.heatmap)
+            else:
+                population, births, deaths, box = self.backend.step_stats(self.heatmap)
+                self.stats.add(self.generation + 1, population, births, deaths, box)
+            self.generation += 1
+
+    def advance(
+        self,
+        generations: int,
+        callback: Callable[[int, int], bool] = None,
+        interval: float = 0.05,
+    ) -> int:
+        """
+        Step the grid a number of generations as fast as possible, without drawing it.
+        The backend is stepped directly: the statistics of these generations aren't
+        recorded (the generations of the records jump), and the heatmap starts again
+        from the last generation.
+
+        Args:
+            generations (int): The number of generations to advance.
+            callback (Callable): Called with (done, generations) about every interval
+                seconds. If it returns False, the grid stops advancing.
+            interval (float): The time between calls to the callback, in seconds.
+
+        Returns:
+            int: The number of generations advanced, less than asked if cancelled.
+        """
+        done = 0
+        chunk = 1
+        last_call = time.perf_counter()
+
+        while done < generations:
+            start = time.perf_counter()
+            count = min(chunk, generations - done)
+            self.backend.step(count)
+            self.generation += count
+            done += count
+
+            # Grow the chunks while they are short, the backend is called less often
+            if time.perf_counter() - start < interval / 10:
+                chunk *= 2
+            elif chunk > 1:
+                chunk //= 2
+
+            now = time.perf_counter()
+            if callback and now - last_call >= interval:
+                last_call = now
+                if callback(done, generations) is False:
+                    break
+
+        if self.heatmap is not None and done:
+            self.heatmap.reset(self.backend.to_rows())
+        return done
+
+    def go_to(self, generation: int, callback: Callable[[int, int], bool] = None) -> int:
+        """
+        Advance the grid up to a generation, see advance.
+        """
+        return self.advance(max(0, generation - self.generation), callback)
+
+    def set_display_mode(self, mode: str):
+        """
+        Show the cells by position, or one of heatmap.MODES. A heatmap is created (with an
+        empty history) if the grid doesn't keep one yet.
+        """
+        if mode in heatmap.MODES and self.heatmap is None:
+            self.heatmap = heatmap.Heatmap(self.width, self.height, self.to_rows())
+        self.display_mode = mode
+
+    def draw(self, surface: pygame.Surface):
+        if self.heatmap is not None and self.display_mode in heatmap.MODES:
+            # The map is the pixel buffer of an 8-bit image, its palette gives the colors
+            image = pygame.image.frombuffer(
+                self.heatmap.map(self.display_mode), (self.width, self.height), "P"
+            )
+            image.set_palette(heatmap.PALETTES[self.display_mode])
+            size = (self.width * self.cell_size, self.height * self.cell_size)
+            position = (self.offset_x * self.cell_size, self.offset_y * self.cell_size)
+            surface.blit(pygame.transform.scale(image, size), position)
+            return
+
+        size = self.cell_size
+        for x, y in self.backend.live_cells():
+            rect = ((x + self.offset_x) * size, (y + self.offset_y) * size, size, size)
+            pygame.draw.rect(surface, (x % 255, y % 255, 100), rect)
 
     def insert_pattern(self, pattern: Pattern, x: int, y: int):
+        old = self.to_rows() if self.heatmap is not None else None
         for i, row in enumerate(pattern.layout):
             for j, _ in enumerate(row):
-                self.cells[x + j][y + i].alive = pattern.at(i, j)
-                self.cells[x + j][y + i].next_status = pattern.at(i, j)
+                if 0 <= x + j < self.width and 0 <= y + i < self.height:
+                    self.backend.set(x + j, y + i, bool(pattern.at(i, j)))
+
+        if old is not None:
+            self.heatmap.edit(old, self.to_rows())
 
     def revive_cell(self, x: int, y: int):
-        self.cells[x][y].alive = True
-        self.cells[x][y].next_status = True
+        if 0 <= x < self.width and 0 <= y < self.height:
+            old = self.to_rows() if self.heatmap is not None else None
+            self.backend.set(x, y, True)
+            if old is not None:
+                self.heatmap.edit(old, self.to_rows())
+
+    def to_rows(self):
+        """
+        Export the grid as a list of rows, where bit x of row y is the cell (x, y).
+        This is the format used by the headless engine.
+        """
+        return self.backend.to_rows()
+
+    def load_rows(self, rows):
+        """
+        Replace the state of the grid with a list of rows, see to_rows.
+        """
+        self.backend.load_rows(rows)
+        if self.heatmap is not None:
+            self.heatmap.reset(rows)
 
     def clear(self):
-        for row in self.cells:
-            for cell in row:
-                cell.alive = False
-                cell.next_status = False
+        self.backend.clear()
+        if self.heatmap is not None:
+            self.heatmap.reset([0] * self.height)
@@ -0,0 +1,344 @@
+# This module reads and writes patterns in the Macrocell format (.mc), used by Golly
+# for very large patterns.
+#
+# A Macrocell file describes a quadtree where identical squares are only stored once:
+#   [M2] (golly 2.0)
+#   #R B3/S23
+#   .*$..*$***$          a leaf: an 8x8 square, rows separated by '$', '*' is alive
+#   4 1 0 0 1            a node: its level (2^level cells per side) and its four children
+#                        (nw, ne, sw, se) as 1-based line numbers, 0 is an empty square
+# Trailing dead cells and rows of a leaf are omitted. The last node is the whole pattern.
+#
+# The file is loaded as the same shared quadtree (see Macrocell), so a pattern of
+# millions of identical blocks stays as small as the file. Only the window that is
+# needed is ever converted to bit rows (see engine.py).
+#
+# Patterns can be converted to Macrocell with formats.py:
+#   python formats.py patterns/copperhead.rle copperhead.mc
+
+import engine
+
+from typing import Dict, Iterator, List, Optional, Tuple
+
+LEAF_LEVEL = 3
+LEAF_SIZE = 1 << LEAF_LEVEL
+
+
+class Node:
+    """
+    A square of 2^level cells per side. Nodes are shared, see Macrocell.node.
+
+    Attributes:
+        level (int): The size of the square, as a power of two.
+        children (tuple): The nw, ne, sw and se quarters, None for leaves.
+        rows (tuple): The 8 rows of a leaf, as bit sets, None for other nodes.
+        population (int): The number of live cells in the square.
+    """
+
+    __slots__ = ("level", "children", "rows", "population")
+
+    def __init__(self, level: int, children: Optional[tuple], rows: Optional[tuple], population):
+        self.level = level
+        self.children = children
+        self.rows = rows
+        self.population = population
+
+
+class Macrocell:
+    """
+    A pattern stored as a quadtree where identical squares are the same node.
+
+    Attributes:
+        name (str): The name of the pattern.
+        rule (str): The rule of the pattern, only B3/S23 can be run by the game.
+        root (Node): The whole pattern, its top-left corner is the cell (0, 0).
+    """
+
+    def __init__(self, name: str = "Unknown Pattern", rule: str = "B3/S23"):
+        self.name = name
+        self.rule = rule
+        self.root: Node = None
+
+        # (level, children or rows) -> node, so identical squares are only stored once
+        self.nodes: Dict[tuple, Node] = {}
+
+    def leaf(self, rows: Tuple[int, ...]) -> Node:
+        key = (LEAF_LEVEL, rows)
+        if key not in self.nodes:
+            self.nodes[key] = Node(LEAF_LEVEL, None, rows, engine.population(rows))
+        return self.nodes[key]
+
+    def node(self, nw: Node, ne: Node, sw: Node, se: Node) -> Node:
+        children = (nw, ne, sw, se)
+        key = (nw.level + 1, tuple(map(id, children)))
+        if key not in self.nodes:
+            population = sum(child.population for child in children)
+            self.nodes[key] = Node(nw.level + 1, children, None, population)
+        return self.nodes[key]
+
+    def empty(self, level: int) -> Node:
+        if level == LEAF_LEVEL:
+            return self.leaf((0,) * LEAF_SIZE)
+        child = self.empty(level - 1)
+        return self.node(child, child, child, child)
+
+    @property
+    def size(self) -> int:
+        return 1 << self.root.level if self.root else 0
+
+    @property
+    def population(self) -> int:
+        return self.root.population if self.root else 0
+
+    def _leaves(self, node: Node, x: int, y: int, window: tuple) -> Iterator[Tuple[int, int, tuple]]:
+        """
+        Yields the (x, y, rows) of the leaves with live cells that overlap a window.
+        """
+        left, top, right, bottom = window
+        size = 1 << node.level
+        if not node.population or x >= right or y >= bottom or x + size <= left or y + size <= top:
+            return
+
+        if node.rows is not None:
+            yield x, y, node.rows
+            return
+
+        half = size // 2
+        nw, ne, sw, se = node.children
+        yield from self._leaves(nw, x, y, window)
+        yield from self._leaves(ne, x + half, y, window)
+        yield from self._leaves(sw, x, y + half, window)
+        yield from self._leaves(se, x + half, y + half, window)
+
+    def leaves(self, x: int = 0, y: int = 0, width: int = None, height: int = None):
+        """
+        Yields the (x, y, rows) of the 8x8 blocks with live cells, in a window of the
+        pattern (all of it by default). Shared squares are visited once per position.
+        """
+        if not self.root:
+            return
+        width = self.size - x if width is None else width
+        height = self.size - y if height is None else height
+        yield from self._leaves(self.root, 0, 0, (x, y, x + width, y + height))
+
+    def cells(self) -> Iterator[Tuple[int, int]]:
+        for leaf_x, leaf_y, rows in self.leaves():
+            for i, row in enumerate(rows):
+                for x in engine.bits(row):
+                    yield leaf_x + x, leaf_y + i
+
+    def bounding_box(self) -> Optional[Tuple[int, int, int, int]]:
+        """
+        The (x, y, width, height) of the live cells, or None if the pattern is empty.
+        """
+        # The box of every shared node is only computed once, relative to its corner
+        boxes: Dict[int, tuple] = {}
+
+        def box(node: Node) -> Optional[tuple]:
+            if not node.population:
+                return None
+            if id(node) in boxes:
+                return boxes[id(node)]
+
+            if node.rows is not None:
+                occupied = [i for i, row in enumerate(node.rows) if row]
+                columns = 0
+                for row in node.rows:
+                    columns |= row
+                low = (columns & -columns).bit_length() - 1
+                result = (low, occupied[0], columns.bit_length(), occupied[-1] + 1)
+            else:
+                half = 1 << (node.level - 1)
+                corners = ((0, 0), (half, 0), (0, half), (half, half))
+                parts = [
+                    (left + x, top + y, right + x, bottom + y)
+                    for child, (x, y) in zip(node.children, corners)
+                    if child.population
+                    for left, top, right, bottom in [box(child)]
+                ]
+                result = tuple(min(part[i] for part in parts) for i in (0, 1)) + tuple(
+                    max(part[i] for part in parts) for i in (2, 3)
+                )
+
+            boxes[id(node)] = result
+            return result
+
+        result = box(self.root) if self.root else None
+        if result is None:
+            return None
+        left, top, right, bottom = result
+        return left, top, right - left, bottom - top
+
+    def to_rows(self, x: int = 0, y: int = 0, width: int = None, height: int = None) -> List[int]:
+        """
+        Export a window of the pattern as bit rows, only the window is expanded.
+        """
+        width = self.size - x if width is None else width
+        height = self.size - y if height is None else height
+
+        rows = [0] * height
+        for leaf_x, leaf_y, leaf_rows in self.leaves(x, y, width, height):
+            shift = leaf_x - x
+            for i, row in enumerate(leaf_rows):
+                if 0 <= leaf_y + i - y < height:
+                    rows[leaf_y + i - y] |= row << shift if shift >= 0 else row >> -shift
+
+        mask = (1 << width) - 1
+        return [row & mask for row in rows]
+
+    @classmethod
+    def from_rows(cls, rows: List[int], width: int, name: str = "Unknown Pattern"):
+        """
+        Build the quadtree of a block of bit rows.
+        """
+        tree = cls(name)
+        side = max(width, len(rows), LEAF_SIZE)
+        level = max(LEAF_LEVEL, (side - 1).bit_length())
+
+        def build(level: int, x: int, y: int) -> Node:
+            size = 1 << level
+            window = rows[y : y + size]
+            if not any((row >> x) & ((1 << size) - 1) for row in window):
+                return tree.empty(level)
+
+            if level == LEAF_LEVEL:
+                leaf = [(row >> x) & 0xFF for row in window]
+                return tree.leaf(tuple(leaf + [0] * (LEAF_SIZE - len(leaf))))
+
+            half = size // 2
+            return tree.node(
+                build(level - 1, x, y),
+                build(level - 1, x + half, y),
+                build(level - 1, x, y + half),
+                build(level - 1, x + half, y + half),
+            )
+
+        tree.root = build(level, 0, 0)
+        return tree
+
+    def to_pattern(self):
+        """
+        The live part of the pattern (its bounding box) as a lazy life.Pattern. The tree is
+        only expanded into bit rows when they are used, or a window of them, see Pattern.window.
+        """
+        from life import Pattern
+
+        box = self.bounding_box()
+        if box is None:
+            return Pattern.from_rows(self.name, [], 0)
+        x, y, width, height = box
+        return Pattern.lazy(
+            self.name,
+            width,
+            height,
+            lambda: self.to_rows(x, y, width, height),
+            lambda left, top, columns, rows: self.to_rows(x + left, y + top, columns, rows),
+        )
+
+
+def _parse_leaf(line: str) -> Tuple[int, ...]:
+    rows = []
+    for text in line.split("$")[:LEAF_SIZE]:
+        row = 0
+        for x, char in enumerate(text):
+            if char == "*":
+                row |= 1 << x
+        rows.append(row)
+    return tuple(rows + [0] * (LEAF_SIZE - len(rows)))
+
+
+def decode_lines(lines) -> Macrocell:
+    """
+    Decodes Macrocell lines (any iterable of strings) into a Macrocell.
+    """
+    tree = Macrocell()
+    nodes: List[Node] = [None]
+
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith("[M2]"):
+            continue
+
+        if line.startswith("#"):
+            if line[1:2] == "N":
+                tree.name = line[2:].strip()
+            elif line[1:2] == "R":
+                tree.rule = line[2:].strip()
+            continue
+
+        if line[0] in ".*$":
+            nodes.append(tree.leaf(_parse_leaf(line)))
+            continue
+
+        try:
+            level, *children = map(int, line.split())
+        except ValueError:
+            raise ValueError(f"Line {number}: invalid Macrocell node '{line}'")
+        if level <= LEAF_LEVEL or len(children) != 4:
+            raise ValueError(f"Line {number}: only two-state Macrocell patterns are supported")
+
+        # 0 is an empty square, the other indices refer to the nodes read so far
+        quarters = [nodes[index] if index else tree.empty(level - 1) for index in children]
+        nodes.append(tree.node(*quarters))
+
+    if len(nodes) == 1:
+        tree.root = tree.empty(LEAF_LEVEL)
+    else:
+        tree.root = nodes[-1]
+    return tree
+
+
+def decode(file_path: str) -> Macrocell:
+    with open(file_path, "r") as file:
+        return decode_lines(file)
+
+
+def _leaf_line(rows: Tuple[int, ...]) -> str:
+    texts = ["".join(".*"[(row >> x) & 1] for x in range(row.bit_length())) for row in rows]
+    while texts and not texts[-1]:
+        texts.pop()
+    return "".join(text + "$" for text in texts)
+
+
+def encode_lines(tree: Macrocell) -> Iterator[str]:
+    """
+    Yields the lines of a Macrocell file, every shared node is written once.
+    """
+    yield "[M2] (life)"
+    yield f"#N {tree.name}"
+    yield f"#R {tree.rule}"
+
+    # Children are written before their parents, empty squares are 0
+    indices: Dict[int, int] = {}
+    lines: List[str] = []
+
+    def visit(node: Node) -> int:
+        if not node.population:
+            return 0
+        if id(node) in indices:
+            return indices[id(node)]
+
+        if node.rows is not None:
+            line = _leaf_line(node.rows)
+        else:
+            line = " ".join(map(str, [node.level, *map(visit, node.children)]))
+
+        lines.append(line)
+        indices[id(node)] = len(lines)
+        return len(lines)
+
+    root = tree.root
+    if root is not None and root.population:
+        # The last line must be a node, so a lone leaf gets a parent
+        if root.rows is not None:
+            empty = tree.empty(LEAF_LEVEL)
+            root = tree.node(root, empty, empty, empty)
+        visit(root)
+
+    yield from lines
+
+
+def encode(tree: Macrocell, file_path: str):
+    with open(file_path, "w") as file:
+        for line in encode_lines(tree):
+            file.write(line + "\n")
@@ -1,7 +1,19 @@
+import time
+
+# The time to the first frame is measured from here, see GameOfLife.start
+STARTED = time.perf_counter()
+
 import pygame
 import os
+import sys
 
-import rle
+import engine
+import resources
+
+from heatmap import Heatmap
+from heatmap import MODES
+from recorder import Recorder
+from stats import StatsStream
 
 from life import Grid
 from life import Pattern
@@ -12,32 +24,56 @@ from GUI import Panel
 from GUI import Menu
 from GUI import MenuBar
 from GUI import MenuItem
+from GUI import ProgressBar
+from GUI import Sparkline
+from GUI import TextInput
 
 from threading import Thread
 from typing import Tuple
 
+# The first frame should be shown within this time (in seconds) after the start
+FIRST_FRAME_TARGET = 0.5
+
 
 class GameOfLife:
-    def __init__(self, grid_size: Tuple[int, int] = (150, 150), cell_size: int = 6):
+    def __init__(
+        self,
+        grid_size: Tuple[int, int] = (150, 150),
+        cell_size: int = 6,
+        backend: str = engine.DEFAULT_BACKEND,
+        stats_path: str = None,
+    ):
         self.grid_width, self.grid_height = grid_size
         self.cell_size = cell_size
+        self.backend = backend
 
         self.colors = {"avery": (11, 20, 26)}
 
         self.paused = False
         self.drawing_mode = False
+        self.recorder: Recorder = None
 
-        # Setup the grid
-        self.cells = Grid(cell_size, self.grid_width, self.grid_height, 0, 4)
+        self.goto_input: TextInput = None
+        self.status = None
+        self.first_frame_time: float = None
 
-        # load the images
+        # Setup the grid. Counting the statistics slows every generation down, so they are
+        # only counted while they are written to stats_path or the sparkline is shown
+        self.stats = StatsStream(self.grid_width, self.grid_height, stats_path)
+        self.cells = Grid(cell_size, self.grid_width, self.grid_height, 0, 4, backend)
+        self.cells.stats = self.stats if stats_path else None
+
+        # The history of the cells is always kept, so it's complete when a heatmap is shown
+        self.cells.heatmap = Heatmap(self.grid_width, self.grid_height, self.cells.to_rows())
+
+        # The images are only loaded when the buttons are first shown
         self.icons = {
-            "play": pygame.image.load("assets/img/play-bttn.png"),
-            "pause": pygame.image.load("assets/img/pause-bttn.png"),
-            "reload": pygame.image.load("assets/img/reload-bttn.png"),
-            "clear": pygame.image.load("assets/img/clear-bttn.png"),
-            "pencil": pygame.image.load("assets/img/pencil-bttn.png"),
-            "cursor": pygame.image.load("assets/img/cursor-bttn.png"),
+            "play": "assets/img/play-bttn.png",
+            "pause": "assets/img/pause-bttn.png",
+            "reload": "assets/img/reload-bttn.png",
+            "clear": "assets/img/clear-bttn.png",
+            "pencil": "assets/img/pencil-bttn.png",
+            "cursor": "assets/img/cursor-bttn.png",
         }
 
         # Setup the buttons
@@ -78,6 +114,9 @@ class GameOfLife:
             pygame.K_SPACE: self.button_pause_clicked,
             pygame.K_r: self.button_reload_clicked,
             pygame.K_c: self.button_clear_clicked,
+            pygame.K_v: self.toggle_recording,
+            pygame.K_g: self.open_goto,
+            pygame.K_h: self.next_display_mode,
         }
 
         # Setup the pattern slider
@@ -85,6 +124,9 @@ class GameOfLife:
             (self.grid_width * cell_size) - 120, (self.grid_height * cell_size) + 50, 50
         )
 
+        # Setup the population sparkline
+        self.sparkline = Sparkline(120, (self.grid_height * cell_size) + 50, 200, 50, "population")
+
         # Setup the bottom panel
         self.bottom_panel = Panel(
             0,
@@ -100,6 +142,7 @@ class GameOfLife:
             self.reload_button,
             self.cursor_button,
             self.slider_ships,
+            self.sparkline,
         ]:
             self.bottom_panel.add_element(element)
 
@@ -119,14 +162,46 @@ class GameOfLife:
         self.menu.add_menu(self.menu_file)
         self.menu.add_menu(self.menu_edit)
 
-        # Load the patterns
-        for file in os.listdir("patterns"):
-            pattern = rle.decode("patterns/" + file)
-            self.slider_ships.add_pattern(pattern)
+        # Load the patterns in the background, the window doesn't wait for them
+        self.library = None
+        self.library_error: Exception = None
+        self.patterns_thread = Thread(target=self.load_patterns, daemon=True)
+        self.patterns_thread.start()
 
         # Run setup after all elements have been created
         self.setup()
 
+    def load_patterns(self):
+        """
+        Decodes and analyses the patterns, runs on a background thread.
+        Errors are kept, to be shown by the main loop (see add_loaded_patterns).
+        """
+        try:
+            from analysis import PatternLibrary
+
+            self.library = PatternLibrary("patterns")
+        except Exception as error:
+            self.library_error = error
+
+    def add_loaded_patterns(self):
+        """
+        Adds the patterns to the slider once they are loaded, by period (shortest first).
+        """
+        if self.library_error is not None:
+            message = (
+                f"Patterns not loaded ({type(self.library_error).__name__}: {self.library_error})"
+            )
+            print(message, file=sys.stderr)
+            self.show_status(message, 10)
+            self.slider_ships.empty_text = "No patterns"
+            self.library_error = None
+            return
+
+        if self.library is None or self.slider_ships.patterns:
+            return
+        for pattern in self.library.sorted("period"):
+            self.slider_ships.add_pattern(pattern)
+
     def setup(self):
         elements = vars(self).items()
 
@@ -140,23 +215,131 @@ class GameOfLife:
         )
 
     def button_reload_clicked(self):
-        self.cells = Grid(self.cell_size, self.grid_width, self.grid_height, 0, 4)
+        display_mode = self.cells.display_mode
+        self.cells = Grid(self.cell_size, self.grid_width, self.grid_height, 0, 4, self.backend)
+        self.attach_stats()
+        self.cells.heatmap = Heatmap(self.grid_width, self.grid_height, self.cells.to_rows())
+        self.cells.set_display_mode(display_mode)
+
+    def attach_stats(self):
+        """
+        Attaches the statistics to the grid while they are written to a file or the
+        bottom panel (with the sparkline) is shown, and detaches them otherwise.
+        """
+        shown = self.bottom_panel.rect.y < self.bottom_panel.down_slide_limit
+        self.cells.stats = self.stats if self.stats.path or shown else None
 
     def button_pause_clicked(self):
         self.paused = not self.paused
-        self.pause_button.set_surface(self.icons["play"] if self.paused else self.icons["pause"])
+        self.pause_button.set_image(self.icons["play"] if self.paused else self.icons["pause"])
 
     def button_clear_clicked(self):
         self.cells.clear()
 
     def button_cursor_clicked(self):
         if self.drawing_mode:
-            self.cursor_button.set_surface(self.icons["cursor"])
+            self.cursor_button.set_image(self.icons["cursor"])
             self.drawing_mode = False
         else:
-            self.cursor_button.set_surface(self.icons["pencil"])
+            self.cursor_button.set_image(self.icons["pencil"])
             self.drawing_mode = True
 
+    def toggle_recording(self):
+        """
+        Starts or stops recording the grid to an animated GIF in the recordings folder.
+        """
+        if self.recorder:
+            self.stop_recording()
+            return
+
+        os.makedirs("recordings", exist_ok=True)
+        path = time.strftime("recordings/life-%Y%m%d-%H%M%S.gif")
+        self.recorder = Recorder(path, self.grid_width, self.grid_height, scale=2, fps=60)
+        pygame.display.set_caption("Game of Life (recording)")
+
+    def stop_recording(self, error: Exception = None):
+        """
+        Stops recording. If the encoder failed, its error is shown on the menu bar.
+        """
+        recorder, self.recorder = self.recorder, None
+        pygame.display.set_caption("Game of Life")
+        if error is None:
+            try:
+                recorder.close()
+            except Exception as close_error:
+                error = close_error
+
+        if error is not None:
+            message = f"Recording failed ({type(error).__name__}: {error})"
+            print(message, file=sys.stderr)
+            self.show_status(message, 10)
+
+    def open_goto(self):
+        """
+        Shows the text box asking for the generation to go to.
+        """
+        width = self.grid_width * self.cell_size
+        self.goto_input = TextInput(
+            width // 4, width // 3, width // 2, "Go to generation:", "0123456789"
+        )
+
+    def next_display_mode(self):
+        """
+        Cycles the colors of the grid: by position, then the age, changed and activity maps.
+        """
+        modes = ("position",) + MODES
+        mode = modes[(modes.index(self.cells.display_mode) + 1) % len(modes)]
+        self.cells.set_display_mode(mode)
+        self.show_status(f"Display: {mode}", 2)
+
+    def show_status(self, text: str, seconds: float = 5):
+        """
+        Shows a message on the menu bar for a few seconds.
+        """
+        self.status = (resources.text(text, 16), time.perf_counter() + seconds)
+
+    def go_to_generation(self, screen: pygame.Surface, generation: int):
+        """
+        Advances the grid to a generation at full speed, without drawing it.
+        The progress and the time left are shown, and Escape cancels.
+        """
+        total = generation - self.cells.generation
+        if total <= 0:
+            self.show_status(f"Already past generation {generation}")
+            return
+
+        width = screen.get_width() // 2
+        bar = ProgressBar(width // 2, screen.get_height() // 3, width, 20)
+        start = time.perf_counter()
+
+        def progress(done, total):
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    # Let the main loop close the window
+                    pygame.event.post(event)
+                    return False
+                if event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
+                    return False
+
+            remaining = (time.perf_counter() - start) / done * (total - done)
+            bar.update(
+                done / total,
+                f"Generation {self.cells.generation} of {generation}, "
+                f"{remaining:.0f}s left (Esc to cancel)",
+            )
+            bar.draw(screen)
+            pygame.display.update(bar.rect)
+            return True
+
+        done = self.cells.advance(total, progress)
+        elapsed = time.perf_counter() - start
+
+        result = "Reached" if done == total else "Cancelled at"
+        self.show_status(
+            f"{result} generation {self.cells.generation} in {elapsed:.1f}s "
+            f"({done / elapsed:,.0f} generations/s)"
+        )
+
     def check_menu(self, mouse_pos, menu):
         """
         Checks if the mouse is hovering over a menu item.
@@ -197,19 +380,31 @@ class GameOfLife:
             mouse_thread.start()
             threads.append(mouse_thread)
 
-            if not self.paused:
-                # Calculate the neighbors
-                for i in range(4):
-                    thread = Thread(target=self.cells.calculate_neighbors, args=(i, 4))
-                    thread.start()
-                    threads.append(thread)
+            goto_generation = None
+            self.add_loaded_patterns()
 
             # Check for events
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
+                    if self.recorder:
+                        self.stop_recording()
+                    self.stats.close()
                     pygame.quit()
                     return
 
+                if event.type == pygame.KEYDOWN and self.goto_input:
+                    # The text box takes the keys while it's open
+                    if event.key == pygame.K_RETURN and self.goto_input.text:
+                        goto_generation = int(self.goto_input.text)
+                        self.goto_input = None
+                    elif event.key == pygame.K_ESCAPE:
+                        self.goto_input = None
+                    elif event.key == pygame.K_BACKSPACE:
+                        self.goto_input.type("\b")
+                    else:
+                        self.goto_input.type(event.unicode)
+                    continue
+
                 if event.type == pygame.KEYDOWN:
                     if event.key in self.shortcuts:
                         self.shortcuts[event.key]()
@@ -248,6 +443,7 @@ class GameOfLife:
             # Slide the panels
             slide_forward = self.bottom_panel.hover(mouse_pos) and pattern is None
             self.bottom_panel.slide(int(0.2 * dt), forward=slide_forward)
+            self.attach_stats()
 
             # Mouse dragging to drawing mode
             if self.drawing_mode and mouse_pressed:
@@ -262,10 +458,21 @@ class GameOfLife:
                 thread.join()
             threads = []
 
+            if goto_generation is not None:
+                self.go_to_generation(screen, goto_generation)
+
             screen.fill((0, 0, 0))
 
             # Update and draw the cells
-            self.cells.evolve(screen)
+            if not self.paused:
+                self.cells.step()
+            self.cells.draw(screen)
+
+            if self.recorder and not self.paused:
+                try:
+                    self.recorder.add(self.cells.to_rows())
+                except Exception as error:
+                    self.stop_recording(error)
 
             # Draw the held pattern
             if pattern is not None:
@@ -285,13 +492,39 @@ class GameOfLife:
             # Draw the pattern slider
             self.slider_ships.draw(screen)
 
+            # Draw the population sparkline
+            self.sparkline.update(self.stats.series("population"))
+            self.sparkline.draw(screen)
+
             # Draw the menu
             self.menu.draw(screen)
 
+            # Draw the status message and the go to text box
+            if self.status and time.perf_counter() < self.status[1]:
+                text = self.status[0]
+                screen.blit(text, (screen.get_width() - text.get_width() - 10, self.cell_size))
+
+            if self.goto_input:
+                self.goto_input.draw(screen)
+
             pygame.display.update()
 
+            if self.first_frame_time is None:
+                self.first_frame_time = time.perf_counter() - STARTED
+                if self.first_frame_time > FIRST_FRAME_TARGET:
+                    print(
+                        f"First frame after {self.first_frame_time * 1000:.0f} ms"
+                        f" (target {FIRST_FRAME_TARGET * 1000:.0f} ms)",
+                        file=sys.stderr,
+                    )
+
 
 if __name__ == "__main__":
     pygame.init()
-    game = GameOfLife()
+
+    # e.g. LIFE_BACKEND=numba LIFE_STATS=stats.csv python main.py
+    game = GameOfLife(
+        backend=os.environ.get("LIFE_BACKEND", engine.DEFAULT_BACKEND),
+        stats_path=os.environ.get("LIFE_STATS"),
+    )
     game.start()
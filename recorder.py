@@ -0,0 +1,484 @@
+# This module records a running universe to an animated GIF, an animated PNG (APNG)
+# or a raw frame pipe.
+#
+# The simulation only puts the rows of each recorded generation in a bounded queue.
+# The frames are encoded by a separate process, so encoding doesn't take time away
+# from the simulation. When the queue is full, frames are dropped instead of making
+# the simulation wait (unless the recorder is created with drop_when_full=False).
+#
+# GIF and APNG frames are palette-indexed and, after the first one, only contain the
+# bounding box of the cells that changed. The cells that didn't change inside that box
+# are transparent, so the output size follows how much the universe changes.
+#
+# Raw pipes receive every frame in full, one byte per pixel (0 or 255), and can be fed
+# to other tools, e.g.:
+#   python recorder.py --size 320x240 --output - | ffmpeg -f rawvideo -pix_fmt gray -s 320x240 -i - out.mp4
+#
+# Usage:
+#   python recorder.py [PATTERN] --size 200x200 --generations 500 --output run.gif
+
+import argparse
+import itertools
+import multiprocessing
+import os
+import queue
+import stat
+import struct
+import sys
+import zlib
+
+import engine
+
+from typing import List, Tuple
+
+# Palette indices
+DEAD = 0
+ALIVE = 1
+UNCHANGED = 2
+
+PALETTE = [(0, 0, 0), (255, 255, 255), (0, 0, 0), (0, 0, 0)]
+
+FORMATS = ("gif", "apng", "raw")
+
+
+def _bounding_box(changes: List[int]):
+    """
+    Returns the (x, y, width, height) box containing all set bits, or None.
+    """
+    ys = [y for y, row in enumerate(changes) if row]
+    if not ys:
+        return None
+
+    merged = 0
+    for y in ys:
+        merged |= changes[y]
+
+    x0 = (merged & -merged).bit_length() - 1
+    x1 = merged.bit_length()
+    return x0, ys[0], x1 - x0, ys[-1] - ys[0] + 1
+
+
+_DIGITS = bytes.maketrans(b"01", b"\x00\x01")
+
+
+def _spread(bits: int, width: int) -> int:
+    """
+    Spread the bits of a row into one byte each, the first cell in the first byte.
+    """
+    digits = format(bits, f"0{width}b")[::-1].encode().translate(_DIGITS)
+    return int.from_bytes(digits, "big")
+
+
+def _row_pixels(row: int, changed: int, width: int) -> bytes:
+    """
+    Convert a row into palette indices, one byte per cell.
+    Cells that didn't change are set to the UNCHANGED (transparent) index.
+    """
+    ones = int.from_bytes(b"\x01" * width, "big")
+    alive = _spread(row, width)
+    moved = _spread(changed, width)
+
+    # Changed cells take their state, the others become UNCHANGED
+    pixels = ((moved ^ ones) << 1) | (moved & alive)
+    return pixels.to_bytes(width, "big")
+
+
+def _scale(pixels: bytes, scale: int) -> bytes:
+    if scale == 1:
+        return pixels
+    return bytes(itertools.chain.from_iterable(zip(*[pixels] * scale)))
+
+
+class _Frames:
+    """
+    Turns universes into frames (boxes of palette indices) relative to the previous one.
+    """
+
+    def __init__(self, width: int, height: int, scale: int):
+        self.width = width
+        self.height = height
+        self.scale = scale
+        self.previous = None
+
+    def next(self, rows: List[int]) -> Tuple[int, int, int, int, List[bytes]]:
+        """
+        Returns the box of the frame in pixels (x, y, width, height) and its pixel rows.
+        """
+        full = (1 << self.width) - 1
+        if self.previous is None:
+            changes = [full] * self.height
+        else:
+            changes = [old ^ new for old, new in zip(self.previous, rows)]
+        self.previous = rows
+
+        # Nothing changed, a single transparent pixel keeps the timing
+        box = _bounding_box(changes) or (0, 0, 1, 1)
+        x, y, width, height = box
+
+        lines = []
+        for i in range(y, y + height):
+            row = (rows[i] >> x) & ((1 << width) - 1)
+            changed = (changes[i] >> x) & ((1 << width) - 1)
+            line = _scale(_row_pixels(row, changed, width), self.scale)
+            lines.extend([line] * self.scale)
+
+        s = self.scale
+        return x * s, y * s, width * s, height * s, lines
+
+
+def _lzw(pixels: bytes, min_code_size: int) -> bytes:
+    """
+    Compress palette indices with GIF's variable-length LZW.
+    """
+    clear = 1 << min_code_size
+    end = clear + 1
+
+    output = bytearray()
+    buffer = 0
+    bits = 0
+
+    def emit(code, size):
+        nonlocal buffer, bits
+        buffer |= code << bits
+        bits += size
+        while bits >= 8:
+            output.append(buffer & 0xFF)
+            buffer >>= 8
+            bits -= 8
+
+    table = {bytes([i]): i for i in range(clear)}
+    next_code = end + 1
+    code_size = min_code_size + 1
+    emit(clear, code_size)
+
+    current = b""
+    for value in pixels:
+        candidate = current + bytes([value])
+        if candidate in table:
+            current = candidate
+            continue
+
+        emit(table[current], code_size)
+        if next_code == 4096:
+            emit(clear, code_size)
+            table = {bytes([i]): i for i in range(clear)}
+            next_code = end + 1
+            code_size = min_code_size + 1
+        else:
+            table[candidate] = next_code
+            if next_code == 1 << code_size:
+                code_size += 1
+            next_code += 1
+        current = bytes([value])
+
+    if current:
+        emit(table[current], code_size)
+    emit(end, code_size)
+    if bits:
+        output.append(buffer & 0xFF)
+
+    return bytes(output)
+
+
+class GifWriter:
+    def __init__(self, file, width: int, height: int, delay: float):
+        self.file = file
+
+        palette = b"".join(bytes(color) for color in PALETTE)
+        file.write(b"GIF89a" + struct.pack("<HHBBB", width, height, 0x81, 0, 0) + palette)
+
+        # Loop forever
+        file.write(b"\x21\xff\x0bNETSCAPE2.0\x03\x01\x00\x00\x00")
+
+        self.delay = max(1, round(delay * 100))
+
+    def write(self, x, y, width, height, lines):
+        # Keep the previous frame and draw over it, UNCHANGED is transparent
+        self.file.write(struct.pack("<BBBBHBB", 0x21, 0xF9, 4, 0x05, self.delay, UNCHANGED, 0))
+        self.file.write(struct.pack("<BHHHHB", 0x2C, x, y, width, height, 0))
+
+        data = _lzw(b"".join(lines), 2)
+        self.file.write(b"\x02")
+        for i in range(0, len(data), 255):
+            chunk = data[i : i + 255]
+            self.file.write(bytes([len(chunk)]) + chunk)
+        self.file.write(b"\x00")
+
+    def close(self):
+        self.file.write(b"\x3b")
+
+
+class ApngWriter:
+    def __init__(self, file, width: int, height: int, delay: float):
+        self.file = file
+        self.frames = 0
+        self.sequence = 0
+        self.delay = (max(1, round(delay * 1000)), 1000)
+
+        file.write(b"\x89PNG\r\n\x1a\n")
+        self._chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 3, 0, 0, 0))
+
+        # The number of frames is only known at the end, it's written on close
+        self.actl_position = file.tell()
+        self._chunk(b"acTL", struct.pack(">II", 0, 0))
+
+        self._chunk(b"PLTE", b"".join(bytes(color) for color in PALETTE))
+        self._chunk(b"tRNS", bytes([255, 255, 0, 255]))
+
+    def _chunk(self, kind: bytes, data: bytes):
+        self.file.write(struct.pack(">I", len(data)) + kind + data)
+        self.file.write(struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF))
+
+    def write(self, x, y, width, height, lines):
+        # The first frame is also the default image and has to replace the canvas
+        blend = 1 if self.frames else 0
+        control = struct.pack(">IIIIIHHBB", self.sequence, width, height, x, y, *self.delay, 0, blend)
+        self._chunk(b"fcTL", control)
+        self.sequence += 1
+
+        data = zlib.compress(b"".join(b"\x00" + line for line in lines), 6)
+        if self.frames:
+            self._chunk(b"fdAT", struct.pack(">I", self.sequence) + data)
+            self.sequence += 1
+        else:
+            self._chunk(b"IDAT", data)
+
+        self.frames += 1
+
+    def close(self):
+        self._chunk(b"IEND", b"")
+
+        self.file.seek(self.actl_position)
+        self._chunk(b"acTL", struct.pack(">II", self.frames, 0))
+
+
+class RawWriter:
+    def __init__(self, file, width: int, height: int, delay: float):
+        self.file = file
+        self.width = width
+        self.canvas = [b"\x00" * width for _ in range(height)]
+
+    def write(self, x, y, width, height, lines):
+        # Draw the box over the canvas and send the whole frame
+        gray = bytes.maketrans(bytes([DEAD, ALIVE]), b"\x00\xff")
+        for i, line in enumerate(lines):
+            row = self.canvas[y + i]
+            merged = bytes(
+                old if new == UNCHANGED else new for old, new in zip(row[x : x + width], line)
+            )
+            self.canvas[y + i] = row[:x] + merged.translate(gray) + row[x + width :]
+
+        self.file.write(b"".join(self.canvas))
+        self.file.flush()
+
+    def close(self):
+        pass
+
+
+_WRITERS = {"gif": GifWriter, "apng": ApngWriter, "raw": RawWriter}
+
+
+def _guess_format(path: str) -> str:
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".gif":
+        return "gif"
+    if extension in (".png", ".apng"):
+        return "apng"
+    return "raw"
+
+
+def _encode(
+    frames: multiprocessing.Queue,
+    errors: multiprocessing.Queue,
+    path,
+    kind,
+    width,
+    height,
+    scale,
+    delay,
+):
+    """
+    Encoder process: writes the frames received from the queue until it gets None.
+    If it fails, the error is sent back to the recorder through errors.
+    """
+    try:
+        file = sys.stdout.buffer if path == "-" else open(path, "wb")
+        try:
+            writer = _WRITERS[kind](file, width * scale, height * scale, delay)
+            converter = _Frames(width, height, scale)
+
+            while (rows := frames.get()) is not None:
+                writer.write(*converter.next(rows))
+            writer.close()
+        finally:
+            if file is not sys.stdout.buffer:
+                file.close()
+    except Exception as error:
+        errors.put(error)
+        sys.exit(1)
+
+
+def _seekable(path: str) -> bool:
+    """
+    Whether the output can go back to a position, a new file is a regular file.
+    """
+    if path == "-":
+        return sys.stdout.buffer.seekable()
+    try:
+        return stat.S_ISREG(os.stat(path).st_mode)
+    except FileNotFoundError:
+        return True
+
+
+class Recorder:
+    """
+    Records a universe, generation by generation, in a separate process.
+
+    Attributes:
+        path (str): The output file, a named pipe, or "-" for the standard output.
+        every (int): Only one generation out of every N is recorded.
+        recorded (int): The number of frames sent to the encoder.
+        dropped (int): The number of frames dropped because the queue was full.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        width: int,
+        height: int,
+        every: int = 1,
+        scale: int = 1,
+        fps: float = 30,
+        kind: str = None,
+        queue_size: int = 64,
+        drop_when_full: bool = True,
+    ):
+        kind = kind or _guess_format(path)
+        if kind not in FORMATS:
+            raise ValueError(f"Unknown format '{kind}', expected one of {', '.join(FORMATS)}")
+
+        # The number of frames of an APNG is written over its header at the end
+        if kind == "apng" and not _seekable(path):
+            raise ValueError("APNG can't be written to a pipe, use a file or the gif or raw format")
+
+        self.path = path
+        self.every = every
+        self.drop_when_full = drop_when_full
+
+        self.recorded = 0
+        self.dropped = 0
+        self.generation = 0
+
+        self.frames = multiprocessing.Queue(queue_size)
+        self.errors = multiprocessing.Queue()
+        self.process = multiprocessing.Process(
+            target=_encode,
+            args=(self.frames, self.errors, path, kind, width, height, scale, 1 / fps),
+            daemon=True,
+        )
+        self.process.start()
+
+    def add(self, rows: List[int]):
+        """
+        Record a generation (rows as bit sets), if it's one of every N.
+        """
+        self.generation += 1
+        if (self.generation - 1) % self.every:
+            return
+
+        # A frame sent to an encoder that stopped would never be written
+        self._check()
+
+        if self.drop_when_full:
+            try:
+                self.frames.put_nowait(rows)
+            except queue.Full:
+                self._check()
+                self.dropped += 1
+                return
+        else:
+            self._put(rows)
+        self.recorded += 1
+
+    def close(self):
+        """
+        Wait for the encoder to write the remaining frames and close the file.
+        """
+        self._put(None)
+        self.process.join()
+        self._check()
+
+    def _put(self, item, timeout: float = 0.1):
+        """
+        Wait for room in the queue, as long as the encoder is running.
+        """
+        while True:
+            try:
+                self.frames.put(item, timeout=timeout)
+                return
+            except queue.Full:
+                self._check()
+
+    def _check(self):
+        """
+        Raise the error of the encoder if it stopped with one.
+        """
+        if self.process.is_alive() or self.process.exitcode == 0:
+            return
+
+        # Nothing reads the queue anymore, the frames left in it can't block the exit
+        self.frames.cancel_join_thread()
+        try:
+            error = self.errors.get(timeout=1)
+        except queue.Empty:
+            error = RuntimeError(f"The encoder stopped with exit code {self.process.exitcode}")
+        raise error
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record a Game of Life run")
+    parser.add_argument("pattern", nargs="?", help="pattern file, random soup if omitted")
+    parser.add_argument("--size", type=engine.parse_size, default=(200, 200), help="WxH")
+    parser.add_argument("--generations", type=int, default=300)
+    parser.add_argument("--output", default="life.gif", help="gif, png, raw file or - (stdout)")
+    parser.add_argument("--format", choices=FORMATS, default=None)
+    parser.add_argument("--every", type=int, default=1, help="record one generation every N")
+    parser.add_argument("--scale", type=int, default=2, help="pixels per cell")
+    parser.add_argument("--fps", type=float, default=30)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument(
+        "--drop-frames", action="store_true", help="drop frames instead of waiting for the encoder"
+    )
+    args = parser.parse_args()
+
+    width, height = args.size
+    rows = engine.initial_rows(args.pattern, width, height, args.seed)
+
+    try:
+        recorder = Recorder(
+            args.output,
+            width,
+            height,
+            every=args.every,
+            scale=args.scale,
+            fps=args.fps,
+            kind=args.format,
+            drop_when_full=args.drop_frames,
+        )
+    except ValueError as error:
+        parser.error(str(error))
+
+    try:
+        recorder.add(rows)
+        for _ in range(args.generations):
+            rows = engine.step_rows(rows, width)
+            recorder.add(rows)
+        recorder.close()
+    except Exception as error:
+        sys.exit(f"Recording failed ({type(error).__name__}: {error})")
+
+    print(f"{recorder.recorded} frames recorded, {recorder.dropped} dropped", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
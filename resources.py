@@ -0,0 +1,115 @@
+# This module loads the images and fonts of the game the first time they are used,
+# and keeps them, so every asset is read once at most, and only if it's needed.
+# Rendered texts are cached as well, a text that doesn't change is rendered once.
+#
+# On slow (e.g. network) file systems, opening every small file takes most of the
+# startup time. The assets can be packed into a single bundle, read in one go:
+#   python resources.py
+# The bundle is used when it exists, except for the files changed after it was packed,
+# which are read from the assets folder. Run the command again after changing the assets.
+
+import io
+import json
+import os
+import struct
+
+import pygame
+
+from functools import lru_cache
+from typing import Dict, Tuple
+
+ASSETS = "assets"
+BUNDLE = os.path.join(ASSETS, "assets.bundle")
+FONT = os.path.join(ASSETS, "font", "Pixellari.ttf")
+
+_MAGIC = b"LIFEASSETS1"
+_INDEX_SIZE = struct.Struct("<I")
+
+# Path -> content of every file of the bundle, None until it's read
+_bundle: Dict[str, bytes] = None
+_bundle_time = 0.0
+
+
+def _read_bundle() -> Dict[str, bytes]:
+    global _bundle, _bundle_time
+    if _bundle is None:
+        _bundle = {}
+        if os.path.exists(BUNDLE):
+            _bundle_time = os.path.getmtime(BUNDLE)
+            with open(BUNDLE, "rb") as file:
+                data = file.read()
+
+            if data.startswith(_MAGIC):
+                start = len(_MAGIC) + _INDEX_SIZE.size
+                (index_size,) = _INDEX_SIZE.unpack_from(data, len(_MAGIC))
+                index = json.loads(data[start : start + index_size])
+
+                body = memoryview(data)[start + index_size :]
+                _bundle = {
+                    path: bytes(body[offset : offset + size])
+                    for path, (offset, size) in index.items()
+                }
+    return _bundle
+
+
+def _source(path: str):
+    """
+    A file object with the content of an asset, from the bundle if it's there and the
+    file wasn't changed since the bundle was packed.
+    """
+    key = os.path.normpath(path).replace(os.sep, "/")
+    data = _read_bundle().get(key)
+    if data is None or (os.path.exists(path) and os.path.getmtime(path) > _bundle_time):
+        return path
+    return io.BytesIO(data)
+
+
+@lru_cache(maxsize=None)
+def image(path: str) -> pygame.Surface:
+    return pygame.image.load(_source(path), os.path.basename(path))
+
+
+@lru_cache(maxsize=None)
+def font(size: int, path: str = FONT) -> pygame.font.Font:
+    return pygame.font.Font(_source(path), size)
+
+
+@lru_cache(maxsize=1024)
+def text(content: str, size: int, color: Tuple[int, int, int] = (255, 255, 255)) -> pygame.Surface:
+    """
+    Render a line of text with the game's font. The surface is shared, don't draw on it.
+    """
+    return font(size).render(content, True, color)
+
+
+def pack(directory: str = ASSETS, output: str = BUNDLE):
+    """
+    Pack every file of the assets folder into a single bundle.
+    """
+    index = {}
+    contents = []
+    offset = 0
+    for root, _, file_names in os.walk(directory):
+        for file_name in sorted(file_names):
+            path = os.path.join(root, file_name)
+            if os.path.abspath(path) == os.path.abspath(output):
+                continue
+
+            with open(path, "rb") as file:
+                data = file.read()
+            index[os.path.normpath(path).replace(os.sep, "/")] = (offset, len(data))
+            contents.append(data)
+            offset += len(data)
+
+    encoded = json.dumps(index).encode()
+    with open(output, "wb") as file:
+        file.write(_MAGIC + _INDEX_SIZE.pack(len(encoded)) + encoded)
+        for data in contents:
+            file.write(data)
+
+    return index
+
+
+if __name__ == "__main__":
+    packed = pack()
+    print(f"{len(packed)} assets packed into {BUNDLE}")
@@ -10,12 +10,22 @@
 #   Each line is a series of runs of cells, where a run is a number followed by a cell.
 #   If the number is omitted, it is assumed to be 1.
 #   Each cell is either 'o' or 'b', where 'o' represents a live cell and 'b' represents a dead cell.
+#   Rows end with a '$', which can also be preceded by a number to skip several rows.
 #   The end of the data is denoted by a '!' character.
+#
+# The file is decoded as it's read, straight into bit rows (see engine.py),
+# so large patterns never go through a list of cells.
 
 from life import Pattern
+import engine
 import re
 import os
 
+_TOKEN = re.compile(r"(\d*)([^\d\s])")
+
+# Lines are kept under this length when encoding, as most programs expect
+_LINE_LENGTH = 70
+
 
 def _open_file(file_path):
     if os.path.exists(file_path):
@@ -26,70 +36,113 @@ def _open_file(file_path):
 
 def decode(file_path):
     """Reads the file and returns a Pattern object"""
-    file = _open_file(file_path)
+    with _open_file(file_path) as file:
+        return decode_lines(file)
+
 
+def decode_lines(lines):
+    """Decodes RLE lines (any iterable of strings) into a Pattern object"""
     pattern_w = None
     pattern_h = None
     pattern_name = "Unknown Pattern"
 
-    line = "stub"
-    while not (line.endswith("!") or not line):
-        # read the next line
-        line = file.readline()
+    rows = []
+    row = 0
+    x = 0
+    width = 0
+
+    for line in lines:
+        line = line.strip()
 
         # information parsing
         if line.startswith("#"):
-            info_type = line[1]
-            match info_type:
-                case "N":
-                    pattern_name = line[2:].strip("\n   ")
+            if line[1:2] == "N":
+                pattern_name = line[2:].strip()
             continue
 
         # header parsing
-        if not (pattern_w and pattern_h):
+        if pattern_w is None:
             match = re.search(r"x\s*=\s*(\d+),\s*y\s*=\s*(\d+)", line)
             if match:
                 pattern_w = int(match.group(1))
                 pattern_h = int(match.group(2))
-
-                cells = [[] for _ in range(pattern_h)]
-
-        # skip non-RLE lines
-        if re.search(r"[^bo$!\d\n]", line):
-            continue
+                continue
 
         # data parsing
-        pattern_lines = line.split("$")
-        offset = 0
-
-        for index, body_line in enumerate(pattern_lines):
-            # skip empty lines
-            if not body_line:
+        for match in _TOKEN.finditer(line):
+            count = int(match.group(1) or 1)
+            tag = match.group(2)
+
+            if tag == "!":
+                rows.append(row)
+                return _pattern(pattern_name, rows, max(width, pattern_w or 0), pattern_h)
+
+            if tag == "$":
+                rows.append(row)
+                rows.extend([0] * (count - 1))
+                row = 0
+                x = 0
                 continue
 
-            for match in re.finditer(r"(\d+)([bo])|([bo])", body_line):
-                # if there is a number, append that many cells
-                if match.group(1):
-                    for i in range(int(match.group(1))):
-                        cells[index + offset].append(1 if match.group(2) == "o" else 0)
+            # 'b' and '.' are dead cells, any other state is considered alive
+            if tag not in "b.":
+                row |= ((1 << count) - 1) << x
+            x += count
+            width = max(width, x)
 
-                # if there is no number, append a single cell
-                else:
-                    cells[index + offset].append(1 if match.group(3) == "o" else 0)
+    rows.append(row)
+    return _pattern(pattern_name, rows, max(width, pattern_w or 0), pattern_h)
 
-            # if the line ends with a number, add that many blank rows
-            if body_line[-1].isnumeric():
-                offset += int(body_line[-1]) - 1
 
-    # pad the pattern with dead cells
-    for row in cells:
-        for i in range(pattern_w - len(row)):
-            row.append(0)
+def _pattern(name, rows, width, height):
+    # pad the pattern with dead rows
+    if height is not None:
+        rows = rows[:height] + [0] * (height - len(rows))
+    return Pattern.from_rows(name, rows, width)
 
-    # return the pattern
-    return Pattern(pattern_name, cells)
 
+def _runs(row, width):
+    """Yields the (count, tag) runs of a row, without the trailing dead cells"""
+    edges = [0, *engine.bits((row ^ (row << 1)) & ((1 << (width + 1)) - 1))]
+    for index, (start, end) in enumerate(zip(edges, edges[1:])):
+        if end > start:
+            yield end - start, "o" if index % 2 else "b"
 
-def encode(self, file_path):
+
+def encode(pattern, file_path):
     """Encodes the Pattern object into a file"""
-    # TODO: encode the pattern into a file
+    with open(file_path, "w") as file:
+        for line in encode_lines(pattern):
+            file.write(line + "\n")
+
+
+def encode_lines(pattern):
+    """Yields the lines of the RLE encoding of a Pattern object"""
+    yield f"#N {pattern.name}"
+    yield f"x = {pattern.width}, y = {pattern.size}, rule = B3/S23"
+
+    tokens = []
+    blank_rows = 0
+    for row in pattern.rows:
+        if not row:
+            blank_rows += 1
+            continue
+
+        # Blank rows are merged into the '$' before the next row
+        if tokens:
+            tokens.append(f"{blank_rows + 1 if blank_rows else ''}$")
+        elif blank_rows:
+            tokens.append(f"{blank_rows}$")
+        blank_rows = 0
+
+        for count, tag in _runs(row, pattern.width):
+            tokens.append(f"{count if count > 1 else ''}{tag}")
+    tokens.append("!")
+
+    line = ""
+    for token in tokens:
+        if len(line) + len(token) > _LINE_LENGTH:
+            yield line
+            line = ""
+        line += token
+    yield line
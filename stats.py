@@ -0,0 +1,171 @@
+# This module records statistics of every generation: the population, the births and
+# deaths, the bounding box of the live cells and the density.
+#
+# The statistics are counted by the backends while they step (see engine.step_stats),
+# so the grid is never scanned again. life.Grid passes them to a StatsStream, which
+# keeps the latest ones in memory (for the sparkline of the GUI) and appends all of
+# them to a file, through a fixed-size buffer. The file can be:
+#   CSV (.csv): a header line, then one line per generation
+#   Binary (any other extension): a header, then one fixed-size record per generation
+#
+# Usage:
+#   python stats.py run patterns/copperhead.rle --size 200x200 --generations 1000 --output run.bin
+#   python stats.py show run.bin > run.csv
+
+import argparse
+import struct
+import sys
+
+import engine
+
+from collections import deque
+from typing import Iterator, NamedTuple
+
+_MAGIC = b"LIFESTATS1"
+_HEADER = struct.Struct("<II")
+_RECORD = struct.Struct("<QQQQiiiid")
+
+
+class Record(NamedTuple):
+    generation: int
+    population: int
+    births: int
+    deaths: int
+    x: int
+    y: int
+    width: int
+    height: int
+    density: float
+
+
+FIELDS = Record._fields
+
+
+class StatsStream:
+    """
+    Receives the statistics of every generation, keeps the latest ones and
+    optionally writes all of them to a file.
+
+    Attributes:
+        width (int): The width of the grid.
+        height (int): The height of the grid.
+        history (deque): The latest records, at most history_size.
+        path (str): The file the records are written to, None to only keep the history.
+    """
+
+    def __init__(
+        self,
+        width: int,
+        height: int,
+        path: str = None,
+        history_size: int = 600,
+        buffer_size: int = 64 * 1024,
+    ):
+        self.width = width
+        self.height = height
+        self.history = deque(maxlen=history_size)
+
+        self.path = path
+        self.file = None
+        self.binary = path is not None and not path.lower().endswith(".csv")
+
+        if path is not None:
+            # The file object buffers the records, memory use doesn't grow with the run
+            self.file = open(path, "wb" if self.binary else "w", buffering=buffer_size)
+            if self.binary:
+                self.file.write(_MAGIC + _HEADER.pack(width, height))
+            else:
+                self.file.write(",".join(FIELDS) + "\n")
+
+    def add(self, generation: int, population: int, births: int, deaths: int, box: tuple):
+        """
+        Add the statistics of a generation, box is the (x, y, width, height) of the live cells.
+        """
+        density = population / (self.width * self.height) if self.width and self.height else 0.0
+        record = Record(generation, population, births, deaths, *box, density)
+        self.history.append(record)
+
+        if self.file is None:
+            return
+        if self.binary:
+            self.file.write(_RECORD.pack(*record))
+        else:
+            self.file.write(",".join(map(str, record[:-1])) + f",{density:.6f}\n")
+
+    def series(self, field: str = "population") -> list:
+        """
+        The latest values of a field, oldest first.
+        """
+        index = FIELDS.index(field)
+        return [record[index] for record in self.history]
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def read(path: str) -> Iterator[Record]:
+    """
+    Yields the records of a statistics file, binary or CSV.
+    """
+    with open(path, "rb") as file:
+        if file.read(len(_MAGIC)) != _MAGIC:
+            file.seek(0)
+            lines = iter(file)
+            next(lines)
+            for line in lines:
+                values = line.decode().strip().split(",")
+                yield Record(*map(int, values[:-1]), float(values[-1]))
+            return
+
+        file.read(_HEADER.size)
+        while True:
+            data = file.read(_RECORD.size * 1024)
+            if not data:
+                return
+            for values in _RECORD.iter_unpack(data[: len(data) - len(data) % _RECORD.size]):
+                yield Record(*values)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record or show per-generation statistics")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run a universe and record its statistics")
+    run_parser.add_argument("pattern", nargs="?", help="pattern file, random soup if omitted")
+    run_parser.add_argument("--size", type=engine.parse_size, default=(200, 200), help="WxH")
+    run_parser.add_argument("--generations", type=int, default=1000)
+    run_parser.add_argument("--output", default="stats.bin", help=".csv or binary")
+    run_parser.add_argument("--backend", default=engine.DEFAULT_BACKEND)
+    run_parser.add_argument("--seed", type=int, default=None)
+
+    show_parser = commands.add_parser("show", help="print a statistics file as CSV")
+    show_parser.add_argument("path")
+
+    args = parser.parse_args()
+
+    if args.command == "show":
+        print(",".join(FIELDS))
+        for record in read(args.path):
+            print(",".join(map(str, record)))
+        return
+
+    width, height = args.size
+    rows = engine.initial_rows(args.pattern, width, height, args.seed)
+
+    backend = engine.create(args.backend, width, height)
+    backend.load_rows(rows)
+
+    stream = StatsStream(width, height, args.output)
+    for generation in range(1, args.generations + 1):
+        stream.add(generation, *backend.step_stats())
+    stream.close()
+
+    if stream.history:
+        last = stream.history[-1]
+        print(f"generation {last.generation}: population {last.population}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
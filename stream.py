@@ -0,0 +1,332 @@
+# This module streams a running universe to remote viewers.
+#
+# The server runs the simulation and sends every generation to the connected clients:
+#   KEYFRAME: the whole universe, each row as alternating runs of dead and live cells.
+#   DELTA: the list of cells that changed since the previous generation.
+# Both are encoded with variable-length integers, so messages stay small.
+#
+# A keyframe is sent when a client joins and every few generations to everyone.
+# Slow clients are never buffered for without limit: while a client's socket is busy,
+# the simulation keeps going, and when the client catches up it skips ahead with a
+# keyframe of the latest generation (or the deltas it missed, if they are still kept).
+#
+# Usage:
+#   python stream.py serve [PATTERN] --size 300x300 --port 5100
+#   python stream.py view localhost:5100
+
+import argparse
+import asyncio
+import socket
+import struct
+import time
+
+import engine
+
+from collections import deque
+from threading import Thread
+from typing import List, Tuple
+
+KEYFRAME = 1
+DELTA = 2
+
+_HEADER = struct.Struct("!BIQ")
+_SIZE = struct.Struct("!II")
+
+
+def _write_varint(output: bytearray, value: int):
+    while value >= 0x80:
+        output.append((value & 0x7F) | 0x80)
+        value >>= 7
+    output.append(value)
+
+
+def _read_varints(data: bytes, offset: int = 0):
+    value = 0
+    shift = 0
+    for byte in data[offset:]:
+        value |= (byte & 0x7F) << shift
+        shift += 7
+        if not byte & 0x80:
+            yield value
+            value = 0
+            shift = 0
+
+
+def encode_keyframe(generation: int, rows: List[int], width: int) -> bytes:
+    mask = (1 << width) - 1
+    body = bytearray(_SIZE.pack(width, len(rows)))
+    for row in rows:
+        # Runs alternate between dead and live cells, starting with dead ones
+        edges = [0, *engine.bits((row ^ (row << 1)) & mask), width]
+
+        _write_varint(body, len(edges) - 1)
+        for start, end in zip(edges, edges[1:]):
+            _write_varint(body, end - start)
+
+    return _HEADER.pack(KEYFRAME, len(body), generation) + body
+
+
+def encode_delta(generation: int, old: List[int], new: List[int], width: int) -> bytes:
+    """
+    Encodes the changed cells as gaps between their indices (y * width + x).
+    """
+    indices = bytearray()
+    count = 0
+    last = 0
+    for y, (before, after) in enumerate(zip(old, new)):
+        for x in engine.bits(before ^ after):
+            index = y * width + x
+            _write_varint(indices, index - last)
+            last = index
+            count += 1
+
+    body = bytearray()
+    _write_varint(body, count)
+    body += indices
+    return _HEADER.pack(DELTA, len(body), generation) + body
+
+
+def decode_keyframe(body: bytes) -> Tuple[int, List[int]]:
+    width, height = _SIZE.unpack_from(body)
+    values = _read_varints(body, _SIZE.size)
+
+    rows = []
+    for _ in range(height):
+        row = 0
+        position = 0
+        for i in range(next(values)):
+            run = next(values)
+            if i % 2:
+                row |= ((1 << run) - 1) << position
+            position += run
+        rows.append(row)
+
+    return width, rows
+
+
+def apply_delta(body: bytes, rows: List[int], width: int):
+    values = _read_varints(body)
+    index = 0
+    for _ in range(next(values)):
+        index += next(values)
+        y, x = divmod(index, width)
+        rows[y] ^= 1 << x
+
+
+class StreamServer:
+    """
+    Runs a universe and streams it to every connected client.
+
+    Attributes:
+        rows (list): The current generation, as bit sets.
+        width (int): The width of the universe.
+        generation (int): The current generation.
+        keyframe_interval (int): A keyframe is sent to everyone every N generations.
+        history (deque): The latest delta messages, used by clients that fell a bit behind.
+    """
+
+    def __init__(self, rows: List[int], width: int, keyframe_interval: int = 100, history=32):
+        self.rows = rows
+        self.width = width
+        self.generation = 0
+
+        self.keyframe_interval = keyframe_interval
+        self.history = deque(maxlen=history)
+
+        self.updated = asyncio.Condition()
+
+    def _keyframe(self) -> bytes:
+        return encode_keyframe(self.generation, self.rows, self.width)
+
+    async def simulate(self, rate: float = 0):
+        """
+        Advance the universe forever, at a number of generations per second (0 for no limit).
+        """
+        while True:
+            start = time.perf_counter()
+
+            new_rows = engine.step_rows(self.rows, self.width)
+            delta = encode_delta(self.generation + 1, self.rows, new_rows, self.width)
+            self.rows = new_rows
+            self.generation += 1
+            self.history.append((self.generation, delta))
+
+            async with self.updated:
+                self.updated.notify_all()
+
+            delay = 1 / rate - (time.perf_counter() - start) if rate else 0
+            await asyncio.sleep(max(0, delay))
+
+    def _messages_since(self, generation: int) -> List[bytes]:
+        """
+        The messages a client that has a generation needs to get to the latest one.
+        """
+        if generation is None or self.generation % self.keyframe_interval == 0:
+            return [self._keyframe()]
+
+        missed = [delta for number, delta in self.history if number > generation]
+        if len(missed) != self.generation - generation:
+            # The client is too far behind, skip ahead
+            return [self._keyframe()]
+        return missed
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        Serve a single client until it disconnects.
+        """
+        sock = writer.get_extra_info("socket")
+        if sock is not None and sock.family in (socket.AF_INET, socket.AF_INET6):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        generation = None
+        try:
+            while True:
+                async with self.updated:
+                    await self.updated.wait_for(lambda: self.generation != generation)
+
+                messages = self._messages_since(generation)
+                generation = self.generation
+                writer.write(b"".join(messages))
+
+                # Waits while the client is slow, the simulation keeps running meanwhile
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str, port: int, rate: float = 0):
+        server = await asyncio.start_server(self.handle, host, port)
+        async with server:
+            await self.simulate(rate)
+
+
+class StreamClient:
+    """
+    Receives a stream on a background thread and keeps the latest generation.
+    """
+
+    def __init__(self, address: str):
+        host, port = address.rsplit(":", 1)
+        self.sock = socket.create_connection((host, int(port)))
+
+        self.width = 0
+        self.rows: List[int] = []
+        self.generation = None
+        self.connected = True
+
+        self.thread = Thread(target=self._receive, daemon=True)
+        self.thread.start()
+
+    def _recv_exact(self, size: int) -> bytes:
+        data = bytearray()
+        while len(data) < size:
+            chunk = self.sock.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError("Server closed the stream")
+            data += chunk
+        return bytes(data)
+
+    def _receive(self):
+        try:
+            while True:
+                kind, size, generation = _HEADER.unpack(self._recv_exact(_HEADER.size))
+                body = self._recv_exact(size)
+
+                if kind == KEYFRAME:
+                    self.width, rows = decode_keyframe(body)
+                    self.rows = rows
+                elif kind == DELTA and self.generation is not None:
+                    rows = list(self.rows)
+                    apply_delta(body, rows, self.width)
+                    self.rows = rows
+                else:
+                    # Deltas before the first keyframe can't be applied
+                    continue
+
+                self.generation = generation
+        except (ConnectionError, OSError):
+            self.connected = False
+
+
+def view(address: str, cell_size: int = 4):
+    """
+    Render a stream with the game's grid.
+    """
+    import pygame
+
+    from life import Grid
+
+    pygame.init()
+    client = StreamClient(address)
+
+    # Wait for the first keyframe to know the size of the universe
+    while client.generation is None and client.connected:
+        time.sleep(0.01)
+    if not client.connected:
+        print("The server closed the stream")
+        return
+
+    width, height = client.width, len(client.rows)
+    grid = Grid(cell_size, width, height, 0, 0)
+
+    screen = pygame.display.set_mode((width * cell_size, height * cell_size))
+    clock = pygame.time.Clock()
+
+    shown = None
+    while True:
+        clock.tick(60)
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                pygame.quit()
+                return
+
+        if client.generation != shown:
+            shown = client.generation
+            grid.load_rows(client.rows)
+            state = "" if client.connected else " (disconnected)"
+            pygame.display.set_caption(f"Game of Life - {address} - generation {shown}{state}")
+
+        screen.fill((0, 0, 0))
+        grid.draw(screen)
+        pygame.display.update()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream a Game of Life run to remote viewers")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = commands.add_parser("serve", help="run a universe and stream it")
+    serve_parser.add_argument("pattern", nargs="?", help="pattern file, random soup if omitted")
+    serve_parser.add_argument("--size", type=engine.parse_size, default=(300, 300), help="WxH")
+    serve_parser.add_argument("--host", default="0.0.0.0")
+    serve_parser.add_argument("--port", type=int, default=5100)
+    serve_parser.add_argument("--rate", type=float, default=60, help="generations/s, 0 = max")
+    serve_parser.add_argument("--keyframes", type=int, default=100, help="generations between")
+    serve_parser.add_argument("--seed", type=int, default=None)
+
+    view_parser = commands.add_parser("view", help="watch a stream")
+    view_parser.add_argument("address", help="host:port")
+    view_parser.add_argument("--cell-size", type=int, default=4)
+
+    args = parser.parse_args()
+
+    if args.command == "view":
+        view(args.address, args.cell_size)
+        return
+
+    width, height = args.size
+    rows = engine.initial_rows(args.pattern, width, height, args.seed)
+
+    async def run():
+        server = StreamServer(rows, width, args.keyframes)
+        await server.serve(args.host, args.port, args.rate)
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
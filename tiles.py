@@ -0,0 +1,376 @@
+# This module stores a universe in fixed-size tiles, so it can be larger than memory.
+#
+# Every tile is a square of cells packed as bits (tile_size rows of tile_size bits).
+# Only the most recently used tiles are kept in memory (an LRU cache). The others are
+# evicted to a memory-mapped file on disk, and tiles without live cells aren't stored
+# at all. A generation is computed tile by tile, in row order, each tile reading a one
+# cell halo from its 8 neighbors, so only a few rows of tiles are needed at a time.
+#
+# The cache and I/O counters (see TiledUniverse.stats) help choosing the tile size and
+# the cache size. The rules and the edges are the same as in engine.py.
+#
+# Usage:
+#   python tiles.py patterns/copperhead.rle --size 1000000x1000000 --generations 100
+
+import argparse
+import mmap
+import os
+import shutil
+import tempfile
+import time
+
+import engine
+
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+Key = Tuple[int, int]
+
+
+class TileStore:
+    """
+    A set of tiles, kept in an LRU cache backed by a memory-mapped file.
+
+    Attributes:
+        tile_size (int): The number of cells on each side of a tile.
+        capacity (int): The maximum number of tiles kept in memory.
+        hits (int): The number of tiles found in the cache.
+        misses (int): The number of tiles that had to be read from disk.
+        reads (int): The number of tiles read from the file.
+        writes (int): The number of tiles written to the file.
+    """
+
+    def __init__(self, path: str, tile_size: int, capacity: int):
+        self.path = path
+        self.tile_size = tile_size
+        self.capacity = capacity
+
+        self.row_bytes = (tile_size + 7) // 8
+        self.tile_bytes = self.row_bytes * tile_size
+
+        # Tile -> slot in the file, slots of deleted tiles are reused
+        self.slots: Dict[Key, int] = {}
+        self.free: List[int] = []
+        self.used_slots = 0
+
+        # Tile -> (rows, dirty), the most recently used tiles last
+        self.cache: "OrderedDict[Key, Tuple[List[int], bool]]" = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.reads = 0
+        self.writes = 0
+
+        self.file = open(path, "w+b")
+        self.file.truncate(self.tile_bytes * 64)
+        self.map = mmap.mmap(self.file.fileno(), 0)
+
+    def __contains__(self, key: Key) -> bool:
+        return key in self.cache or key in self.slots
+
+    def keys(self):
+        return set(self.cache) | set(self.slots)
+
+    def _write(self, key: Key, rows: List[int]):
+        if key not in self.slots:
+            if self.free:
+                self.slots[key] = self.free.pop()
+            else:
+                self.slots[key] = self.used_slots
+                self.used_slots += 1
+
+                # Double the file when it's full
+                if self.used_slots * self.tile_bytes > len(self.map):
+                    self.map.resize(len(self.map) * 2)
+
+        offset = self.slots[key] * self.tile_bytes
+        self.map[offset : offset + self.tile_bytes] = b"".join(
+            row.to_bytes(self.row_bytes, "little") for row in rows
+        )
+        self.writes += 1
+
+    def _read(self, key: Key) -> List[int]:
+        offset = self.slots[key] * self.tile_bytes
+        data = self.map[offset : offset + self.tile_bytes]
+        self.reads += 1
+
+        size = self.row_bytes
+        return [int.from_bytes(data[i : i + size], "little") for i in range(0, len(data), size)]
+
+    def _cache(self, key: Key, rows: List[int], dirty: bool):
+        self.cache[key] = (rows, dirty)
+        self.cache.move_to_end(key)
+
+        while len(self.cache) > self.capacity:
+            old_key, (old_rows, old_dirty) = self.cache.popitem(last=False)
+            if old_dirty:
+                self._write(old_key, old_rows)
+
+    def get(self, key: Key) -> Optional[List[int]]:
+        """
+        The rows of a tile, or None if the tile is empty.
+        """
+        if key in self.cache:
+            self.hits += 1
+            self.cache.move_to_end(key)
+            return self.cache[key][0]
+
+        if key not in self.slots:
+            return None
+
+        self.misses += 1
+        rows = self._read(key)
+        self._cache(key, rows, False)
+        return rows
+
+    def put(self, key: Key, rows: List[int]):
+        """
+        Store a tile. Empty tiles are deleted instead.
+        """
+        if not any(rows):
+            self.cache.pop(key, None)
+            if key in self.slots:
+                self.free.append(self.slots.pop(key))
+            return
+
+        self._cache(key, rows, True)
+
+    def clear(self):
+        """
+        Delete every tile, the file is kept to be reused.
+        """
+        self.slots.clear()
+        self.free.clear()
+        self.cache.clear()
+        self.used_slots = 0
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+
+class TiledUniverse:
+    """
+    A bounded universe stored in tiles, see TileStore.
+
+    Attributes:
+        width (int): The width of the universe.
+        height (int): The height of the universe.
+        tile_size (int): The number of cells on each side of a tile.
+        generation (int): The current generation.
+    """
+
+    def __init__(
+        self,
+        width: int,
+        height: int,
+        tile_size: int = 64,
+        cache_tiles: int = 4096,
+        directory: str = None,
+    ):
+        self.width = width
+        self.height = height
+        self.tile_size = tile_size
+        self.generation = 0
+
+        self.tiles_x = (width + tile_size - 1) // tile_size
+        self.tiles_y = (height + tile_size - 1) // tile_size
+
+        self.directory = directory or tempfile.mkdtemp(prefix="life-tiles-")
+        self.owns_directory = directory is None
+
+        # The next generation is written to the second store, then they are swapped
+        self.store = TileStore(os.path.join(self.directory, "tiles-0.bin"), tile_size, cache_tiles)
+        self.spare = TileStore(os.path.join(self.directory, "tiles-1.bin"), tile_size, cache_tiles)
+
+    def _mask(self, tx: int, ty: int) -> Tuple[int, int]:
+        """
+        The bits of a tile that are inside the universe, and how many of its rows are.
+        """
+        columns = min(self.tile_size, self.width - tx * self.tile_size)
+        rows = min(self.tile_size, self.height - ty * self.tile_size)
+        return (1 << columns) - 1, rows
+
+    def load_rows(self, rows: List[int], x: int = 0, y: int = 0):
+        """
+        Draw a block of rows (as bit sets) with its top-left corner at (x, y).
+        """
+        for i, row in enumerate(rows):
+            for cell_x in engine.bits(row):
+                self.set_cell(x + cell_x, y + i, True)
+
+    def set_cell(self, x: int, y: int, alive: bool):
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return
+
+        size = self.tile_size
+        key = (x // size, y // size)
+        rows = list(self.store.get(key) or [0] * size)
+
+        bit = 1 << (x % size)
+        rows[y % size] = rows[y % size] | bit if alive else rows[y % size] & ~bit
+        self.store.put(key, rows)
+
+    def get_cell(self, x: int, y: int) -> bool:
+        size = self.tile_size
+        rows = self.store.get((x // size, y // size))
+        return bool(rows and (rows[y % size] >> (x % size)) & 1)
+
+    def _extended(self, tx: int, ty: int) -> Optional[List[int]]:
+        """
+        The rows of a tile with a one cell halo taken from its 8 neighbors,
+        or None if the tile and its neighbors are all empty.
+        """
+        size = self.tile_size
+        around = {(i, j): self.store.get((tx + i, ty + j)) for j in (-1, 0, 1) for i in (-1, 0, 1)}
+        if not any(around.values()):
+            return None
+
+        def halo_row(j: int, index: int) -> int:
+            left, center, right = around[(-1, j)], around[(0, j)], around[(1, j)]
+
+            row = center[index] << 1 if center else 0
+            if left:
+                row |= (left[index] >> (size - 1)) & 1
+            if right:
+                row |= (right[index] & 1) << (size + 1)
+            return row
+
+        return [halo_row(-1, -1)] + [halo_row(0, i) for i in range(size)] + [halo_row(1, 0)]
+
+    def step(self):
+        """
+        Calculate the next generation, one tile at a time.
+        """
+        size = self.tile_size
+        inner = (1 << size) - 1
+
+        # Empty tiles can only come to life next to a tile with live cells
+        candidates = set()
+        for tx, ty in self.store.keys():
+            for i in (-1, 0, 1):
+                for j in (-1, 0, 1):
+                    if 0 <= tx + i < self.tiles_x and 0 <= ty + j < self.tiles_y:
+                        candidates.add((tx + i, ty + j))
+
+        self.spare.clear()
+
+        # Row order keeps the neighbors of the next tiles in the cache
+        for tx, ty in sorted(candidates, key=lambda key: (key[1], key[0])):
+            extended = self._extended(tx, ty)
+            if extended is None:
+                continue
+
+            new_rows = engine.step_rows(extended[1:-1], size + 2, extended[0], extended[-1])
+
+            mask, height = self._mask(tx, ty)
+            rows = [(row >> 1) & inner & mask for row in new_rows[:height]]
+            rows += [0] * (size - height)
+            self.spare.put((tx, ty), rows)
+
+        self.store, self.spare = self.spare, self.store
+        self.generation += 1
+
+    def population(self) -> int:
+        return sum(engine.population(self.store.get(key)) for key in self.store.keys())
+
+    def to_rows(self, x: int = 0, y: int = 0, width: int = None, height: int = None) -> List[int]:
+        """
+        Export a window of the universe as rows (bit sets), the whole universe by default.
+        """
+        width = self.width - x if width is None else width
+        height = self.height - y if height is None else height
+        size = self.tile_size
+
+        rows = [0] * height
+        for ty in range(y // size, (y + height - 1) // size + 1):
+            for tx in range(x // size, (x + width - 1) // size + 1):
+                tile = self.store.get((tx, ty))
+                if not tile:
+                    continue
+                for i, row in enumerate(tile):
+                    cell_y = ty * size + i
+                    if y <= cell_y < y + height:
+                        shift = tx * size - x
+                        rows[cell_y - y] |= row << shift if shift >= 0 else row >> -shift
+
+        mask = (1 << width) - 1
+        return [row & mask for row in rows]
+
+    def stats(self) -> dict:
+        """
+        Cache and I/O counters, to tune the tile size and the cache size.
+        """
+        stores = (self.store, self.spare)
+        hits = sum(store.hits for store in stores)
+        misses = sum(store.misses for store in stores)
+        return {
+            "tiles": len(self.store.keys()),
+            "cached_tiles": len(self.store.cache),
+            "cache_hits": hits,
+            "cache_misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 1.0,
+            "tiles_read": sum(store.reads for store in stores),
+            "tiles_written": sum(store.writes for store in stores),
+            "disk_bytes": sum(len(store.map) for store in stores),
+        }
+
+    def close(self):
+        self.store.close()
+        self.spare.close()
+        if self.owns_directory:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a universe stored in tiles on disk")
+    parser.add_argument("pattern", nargs="?", help="pattern file, random soup if omitted")
+    parser.add_argument("--size", type=engine.parse_size, default=(100000, 100000), help="WxH")
+    parser.add_argument("--soup", type=engine.parse_size, default=(512, 512), help="random soup WxH")
+    parser.add_argument("--generations", type=int, default=100)
+    parser.add_argument("--tile", type=int, default=64, help="cells per tile side")
+    parser.add_argument("--cache", type=int, default=4096, help="tiles kept in memory")
+    parser.add_argument("--directory", default=None, help="where the tile files are stored")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    width, height = args.size
+    universe = TiledUniverse(width, height, args.tile, args.cache, args.directory)
+
+    if args.pattern and args.pattern.lower().endswith(".mc"):
+        import macrocell
+
+        # Macrocell patterns are loaded one 8x8 block at a time, never as whole rows,
+        # and only the blocks that fall inside the universe are visited
+        tree = macrocell.decode(args.pattern)
+        box_x, box_y, box_width, box_height = tree.bounding_box() or (0, 0, 0, 0)
+        x, y = (width - box_width) // 2 - box_x, (height - box_height) // 2 - box_y
+        for leaf_x, leaf_y, rows in tree.leaves(-x, -y, width, height):
+            universe.load_rows(rows, x + leaf_x, y + leaf_y)
+    else:
+        if args.pattern:
+            import formats
+
+            pattern = formats.read(args.pattern)
+            rows, block_width = pattern.rows, pattern.width
+        else:
+            block_width = args.soup[0]
+            rows = engine.random_rows(block_width, args.soup[1], args.seed)
+
+        universe.load_rows(rows, (width - block_width) // 2, (height - len(rows)) // 2)
+
+    start = time.perf_counter()
+    for _ in range(args.generations):
+        universe.step()
+    elapsed = time.perf_counter() - start
+
+    print(f"generation {universe.generation}: population {universe.population()}")
+    print(f"{args.generations / elapsed:.1f} generations/second")
+    for name, value in universe.stats().items():
+        print(f"  {name}: {value:.3f}" if isinstance(value, float) else f"  {name}: {value}")
+
+    universe.close()
+
+
+if __name__ == "__main__":
+    main()